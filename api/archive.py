@@ -0,0 +1,110 @@
+import contextvars
+import datetime
+import heapq
+from contextlib import contextmanager
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedBooking, Booking
+
+_archiving = contextvars.ContextVar('archiving_bookings', default=False)
+
+# Booking columns by field name, as values() returns them, and attribute name.
+_COLUMNS = [(field.name, field.attname) for field in Booking._meta.concrete_fields]
+
+
+def is_archiving():
+    """True while archive_bookings() deletes the bookings it has copied."""
+    return _archiving.get()
+
+
+@contextmanager
+def _archiving_bookings():
+    token = _archiving.set(True)
+    try:
+        yield
+    finally:
+        _archiving.reset(token)
+
+
+def horizon(today=None):
+    """The first booking date kept in the Booking table."""
+    today = today or timezone.localdate()
+    return today - datetime.timedelta(days=getattr(settings, 'BOOKING_ARCHIVE_HORIZON_DAYS', 180))
+
+
+def reaches_archive(date_from):
+    """True if bookings dated from ``date_from`` on may be in ArchivedBooking."""
+    return date_from is None or date_from < horizon()
+
+
+def archive_bookings(before, batch_size=1000):
+    """
+    Move bookings dated before ``before`` to ArchivedBooking, keeping their
+    IDs. Each batch is copied and deleted in one transaction. The deletes
+    are not past bookings being cancelled, so the occupancy rollup and the
+    availability stream ignore them. Returns the number moved.
+    """
+    moved, last_id = 0, 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Booking.objects.filter(bookingDate__lt=before, pk__gt=last_id).order_by('pk')
+                .values(*(name for name, _ in _COLUMNS))[:batch_size])
+            if not rows:
+                return moved
+            last_id = rows[-1]['id']
+            ArchivedBooking.objects.bulk_create(
+                [ArchivedBooking(**{attname: row[name] for name, attname in _COLUMNS}) for row in rows],
+                ignore_conflicts=True)
+            with _archiving_bookings():
+                Booking.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            moved += len(rows)
+
+
+class MergedBookings:
+    """
+    Bookings from the hot and archive tables as one sequence ordered by id.
+    It supports the order_by(), filter() and slicing that KeysetPagination
+    uses: each is applied to both querysets, and a slice fetches up to its
+    stop from each table and merges the two.
+    """
+
+    def __init__(self, querysets, reverse=False):
+        self.querysets = querysets
+        self.reverse = reverse
+
+    def order_by(self, *ordering):
+        return MergedBookings([queryset.order_by(*ordering) for queryset in self.querysets],
+                              reverse=ordering[0].startswith('-'))
+
+    def filter(self, *args, **kwargs):
+        return MergedBookings([queryset.filter(*args, **kwargs) for queryset in self.querysets], self.reverse)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.stop is None:
+            raise TypeError('MergedBookings only supports bounded slices.')
+        merged = heapq.merge(*(queryset[:index.stop] for queryset in self.querysets),
+                             key=attrgetter('pk'), reverse=self.reverse)
+        return list(merged)[index]
+
+
+def bookings_between(date_from=None, date_to=None, prepare=lambda queryset: queryset):
+    """
+    Bookings dated within the range, read from the archive as well when the
+    range reaches back past the horizon. ``prepare`` is applied to each
+    table's queryset (select_related, only, ...).
+    """
+    filters = {}
+    if date_from is not None:
+        filters['bookingDate__gte'] = date_from
+    if date_to is not None:
+        filters['bookingDate__lte'] = date_to
+    hot = prepare(Booking.objects.filter(**filters))
+    if (date_from is None and date_to is None) or not reaches_archive(date_from):
+        return hot
+    # Bookings past the horizon may be in either table until the next archive run.
+    return MergedBookings([hot, prepare(ArchivedBooking.objects.filter(**filters))])
@@ -0,0 +1,164 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import holds
+from .authentication import CachedJWTAuthentication
+from .availability import availability_index
+from .db import read_replica
+from .events import availability_broker
+from .field_plans import field_plan
+from .models import ArchivedBooking, Booking, City, Location, ParkingSpot
+from .serializers import (
+    AvailabilityQuerySerializer,
+    BookingSerializer,
+    CitySerializer,
+    LocationSerializer,
+    ParkingSpotSerializer,
+)
+
+# Async counterparts of the read endpoints in api/views.py, for ASGI
+# deployments. They return the same payloads, but query through the async
+# ORM so a request waiting on the database does not hold a worker thread.
+# Serializers are only used on loaded instances and never touch the database.
+
+
+def _request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+@require_GET
+@read_replica
+async def get_all_cities(request):
+    cities = [city async for city in City.objects.all()]
+    return JsonResponse({'Cities': CitySerializer(cities, many=True).data})
+
+
+@csrf_exempt
+@require_POST
+@read_replica
+async def get_locations_by_city(request):
+    data = _request_data(request)
+    city_id = data.get('city_id') if isinstance(data, dict) else None
+    if city_id is None:
+        return JsonResponse({'error': 'city_id not provided in the request data'}, status=400)
+    try:
+        city_id = int(city_id)
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'city_id must be an integer'}, status=400)
+    locations = [location async for location in Location.objects.filter(city_id=city_id)]
+    return JsonResponse({'Locations': LocationSerializer(locations, many=True).data})
+
+
+@csrf_exempt
+@require_POST
+@read_replica
+async def get_spot_numbers_by_location(request):
+    data = _request_data(request)
+    if not isinstance(data, dict) or data.get('location_id') is None:
+        return JsonResponse({'error': 'location_id not provided in the request data'}, status=400)
+
+    query = AvailabilityQuerySerializer(data=data)
+    if not query.is_valid():
+        return JsonResponse(query.errors, status=400)
+    params = query.validated_data
+
+    if 'bookingDate' in params:
+        busy = await sync_to_async(availability_index.busy_spot_ids)(
+            params['location_id'], params['bookingDate'], params['startTime'], params['endTime'])
+        spot_numbers = ParkingSpot.objects.filter(location_id=params['location_id']).exclude(id__in=busy)
+    else:
+        spot_numbers = ParkingSpot.objects.filter(location_id=params['location_id'], lsBooked=False)
+    # The JWT bearer, as the sync view authenticates it, so callers see
+    # their own holds in both.
+    try:
+        found = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as exc:
+        return JsonResponse({'detail': exc.detail}, status=exc.status_code)
+    user_id = found[0].pk if found is not None else None
+    plan = field_plan(ParkingSpotSerializer)
+    spots = plan.serialize([row async for row in plan.values_list(spot_numbers)])
+    held = await sync_to_async(holds.held_by_others)([spot['id'] for spot in spots], user_id)
+    if held:
+        spots = [spot for spot in spots if spot['id'] not in held]
+    return JsonResponse({'SpotNumbers': spots})
+
+
+@require_GET
+async def get_booking(request, pk):
+    booking = await Booking.objects.filter(pk=pk).afirst()
+    if booking is None:
+        # Past bookings may have been archived under the same ID.
+        booking = await ArchivedBooking.objects.filter(pk=pk).afirst()
+    if booking is None:
+        return JsonResponse({'detail': 'Booking not found with the specified ID'}, status=404)
+    return JsonResponse(BookingSerializer(booking).data)
+
+
+# Seconds between keep-alive comments on an idle event stream.
+STREAM_KEEPALIVE = 15
+
+
+def _sse(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append('data: ' + json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+async def _spot_snapshot(location_id):
+    spots = [spot async for spot in ParkingSpot.objects.filter(location_id=location_id)]
+    return {'location_id': location_id, 'spots': ParkingSpotSerializer(spots, many=True).data}
+
+
+@require_GET
+async def spot_availability_stream(request, location_id):
+    """
+    Server-Sent Events stream of a location's spots: a ``snapshot`` event
+    with every spot, then ``spot`` and ``booking`` events as they change.
+    Clients replace their state on ``snapshot`` and apply the others.
+    Only served over ASGI: a WSGI server (runserver included) would collect
+    the endless stream before sending any of it.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'The availability stream needs the ASGI application '
+                                       '(parkingrevolution.asgi), e.g. under daphne or uvicorn.'}, status=501)
+    if not await Location.objects.filter(pk=location_id).aexists():
+        return JsonResponse({'detail': 'Location not found with the specified ID'}, status=404)
+
+    # Subscribe before reading the snapshot so no change falls in between.
+    queue = availability_broker.subscribe(location_id)
+
+    async def stream():
+        try:
+            yield _sse('snapshot', await _spot_snapshot(location_id))
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event['type'] == 'resync':
+                    yield _sse('snapshot', await _spot_snapshot(location_id), event['id'])
+                else:
+                    yield _sse(event['type'], event, event['id'])
+        finally:
+            availability_broker.unsubscribe(location_id, queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
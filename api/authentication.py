@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _cache():
+    return caches[getattr(settings, 'JWT_USER_CACHE_ALIAS', 'default')]
+
+
+def forget_user(user_id):
+    _cache().delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the token's user in the cache for
+    JWT_USER_CACHE_TIMEOUT seconds instead of loading it on every request.
+    Entries are dropped when the user is saved or deleted (api/signals.py),
+    so deactivation and password changes take effect on the next request.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = user_cache_key(user_id)
+        user = _cache().get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            _cache().set(key, user, getattr(settings, 'JWT_USER_CACHE_TIMEOUT', 60))
+            return user
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
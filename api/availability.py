@@ -0,0 +1,145 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Booking
+
+
+class AvailabilityIndex:
+    """
+    Per-process index of booked intervals, keyed by (location, date).
+
+    Each key holds, per spot, the bookings of that day as a list of
+    (startTime, endTime, booking id) sorted by start time. Keys are loaded
+    lazily with one indexed query and kept in sync by the Booking signals
+    in api/signals.py; the TTL bounds staleness from writes made by other
+    processes.
+    """
+
+    def __init__(self, max_keys=None, ttl=None):
+        self.max_keys = max_keys or getattr(settings, 'AVAILABILITY_INDEX_MAX_KEYS', 10000)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'AVAILABILITY_INDEX_TTL', 60)
+        self._lock = threading.RLock()
+        self._days = OrderedDict()   # (location_id, date) -> (loaded_at, {spot_id: [(start, end, booking_id)]})
+        self._bookings = {}          # booking_id -> ((location_id, date), spot_id)
+        self._loading = {}           # (location_id, date) -> journals of the loads under way
+
+    def busy_spot_ids(self, location_id, date, start, end):
+        key = (location_id, date)
+        with self._lock:
+            spots = self._fresh_day(key)
+            if spots is not None:
+                return self._busy(spots, start, end)
+            # Read the day without the lock, so a slow load does not hold
+            # up other lookups or the on-commit updates; those made to this
+            # day meanwhile are journaled and replayed onto what was read.
+            journal = []
+            self._loading.setdefault(key, []).append(journal)
+        try:
+            rows = list(Booking.objects.filter(
+                spot_id__location_id=location_id, bookingDate=date,
+            ).values_list('id', 'spot_id', 'startTime', 'endTime'))
+        finally:
+            with self._lock:
+                journals = self._loading[key]
+                journals.remove(journal)
+                if not journals:
+                    del self._loading[key]
+        with self._lock:
+            spots = self._fresh_day(key)
+            if spots is None:
+                spots = self._install(key, rows, journal)
+            return self._busy(spots, start, end)
+
+    def add_booking(self, booking_id, location_id, spot_id, date, start, end):
+        with self._lock:
+            self._discard(booking_id)
+            key = (location_id, date)
+            for journal in self._loading.get(key, ()):
+                journal.append(('add', (booking_id, location_id, spot_id, date, start, end)))
+            if key not in self._days:
+                return
+            insort(self._days[key][1].setdefault(spot_id, []), (start, end, booking_id))
+            self._bookings[booking_id] = (key, spot_id)
+
+    def remove_booking(self, booking_id):
+        with self._lock:
+            self._discard(booking_id)
+            for journals in self._loading.values():
+                for journal in journals:
+                    journal.append(('remove', booking_id))
+
+    def invalidate_location(self, location_id):
+        with self._lock:
+            for key in [key for key in self._days if key[0] == location_id]:
+                self._evict(key)
+            for key, journals in self._loading.items():
+                if key[0] == location_id:
+                    for journal in journals:
+                        journal.append(('invalidate', None))
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+            self._bookings.clear()
+
+    @staticmethod
+    def _busy(spots, start, end):
+        busy = set()
+        for spot_id, intervals in spots.items():
+            # Only intervals starting before the window ends can overlap it.
+            for interval_start, interval_end, _ in intervals[:bisect_left(intervals, (end,))]:
+                if interval_end > start:
+                    busy.add(spot_id)
+                    break
+        return busy
+
+    def _fresh_day(self, key):
+        entry = self._days.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self._days.move_to_end(key)
+            return entry[1]
+        if entry is not None:
+            self._evict(key)
+        return None
+
+    def _install(self, key, rows, journal):
+        spots = {}
+        for booking_id, spot_id, start, end in rows:
+            spots.setdefault(spot_id, []).append((start, end, booking_id))
+            self._bookings[booking_id] = (key, spot_id)
+        for intervals in spots.values():
+            intervals.sort()
+
+        self._days[key] = (time.monotonic(), spots)
+        for change, args in journal:
+            if change == 'add':
+                self.add_booking(*args)
+            elif change == 'remove':
+                self._discard(args)
+        if any(change == 'invalidate' for change, _ in journal):
+            # Spots moved while the day was read: answer from it, but do not keep it.
+            self._evict(key)
+        while len(self._days) > self.max_keys:
+            self._evict(next(iter(self._days)))
+        return spots
+
+    def _discard(self, booking_id):
+        found = self._bookings.pop(booking_id, None)
+        if found is None:
+            return
+        key, spot_id = found
+        intervals = self._days[key][1].get(spot_id, [])
+        intervals[:] = [interval for interval in intervals if interval[2] != booking_id]
+
+    def _evict(self, key):
+        _, spots = self._days.pop(key)
+        for intervals in spots.values():
+            for _, _, booking_id in intervals:
+                self._bookings.pop(booking_id, None)
+
+
+availability_index = AvailabilityIndex()
@@ -0,0 +1,17 @@
+import statistics
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Latency percentiles (ms) and throughput for one benchmark run."""
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    else:
+        quantiles = latencies * 99 or [0.0] * 99
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': quantiles[49] * 1000,
+        'p95_ms': quantiles[94] * 1000,
+        'p99_ms': quantiles[98] * 1000,
+    }
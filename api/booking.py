@@ -0,0 +1,115 @@
+import threading
+from contextlib import ExitStack
+
+from django.db import connection, router, transaction
+from django.db.models.signals import post_save
+
+from . import occupancy
+from .models import Booking, ParkingSpot
+
+
+class BookingConflict(Exception):
+    def __init__(self, conflicts):
+        self.conflicts = list(conflicts)
+        super().__init__('Spot is already booked for the requested time.')
+
+
+_spot_locks = [threading.Lock() for _ in range(64)]
+_sqlite_write_lock = threading.Lock()
+
+
+def spot_lock(spot_id):
+    # SQLite ignores SELECT ... FOR UPDATE and allows a single writer, so
+    # writers in this process queue here instead of failing on a busy
+    # database. Other backends only use the stripes to keep contending
+    # threads off the database row lock.
+    if connection.vendor == 'sqlite':
+        return _sqlite_write_lock
+    return _spot_locks[spot_id % len(_spot_locks)]
+
+
+def spot_locks(spot_ids):
+    """The locks spot_lock() would hand out for ``spot_ids``, in a fixed order so batches cannot deadlock."""
+    if connection.vendor == 'sqlite':
+        return [_sqlite_write_lock]
+    return [_spot_locks[stripe] for stripe in sorted({spot_id % len(_spot_locks) for spot_id in spot_ids})]
+
+
+def overlapping_bookings(spot_id, date, start, end, exclude=None):
+    bookings = Booking.objects.filter(
+        spot_id=spot_id, bookingDate=date, startTime__lt=end, endTime__gt=start)
+    if exclude is not None:
+        bookings = bookings.exclude(pk=exclude)
+    return bookings
+
+
+def save_booking(serializer, **extra):
+    """
+    Save a validated BookingSerializer unless it overlaps another booking
+    of the same spot. The spot row is locked for the check and the insert,
+    so concurrent requests for one spot are decided one at a time. Extra
+    keyword arguments are passed on to ``serializer.save()``.
+    """
+    data = serializer.validated_data
+    instance = serializer.instance
+
+    def current(name):
+        if name in data:
+            return data[name]
+        return getattr(instance, name)
+
+    spot = current('spot_id')
+    with spot_lock(spot.pk), transaction.atomic():
+        ParkingSpot.objects.select_for_update().get(pk=spot.pk)
+        conflicts = overlapping_bookings(
+            spot.pk, current('bookingDate'), current('startTime'), current('endTime'),
+            exclude=instance.pk if instance is not None else None,
+        ).values_list('pk', flat=True)
+        if conflicts:
+            raise BookingConflict(conflicts)
+        return serializer.save(**extra)
+
+
+def save_booking_batch(user, spots, dates, start, end, atomic=True, batch_size=500):
+    """
+    Book every spot in ``spots`` on every date in ``dates`` from ``start``
+    to ``end``. With the spots locked, the conflicts of all occurrences are
+    read with one query and the free occurrences are written with one
+    bulk_create in the same transaction. Returns ``(bookings, conflicts)``,
+    where ``conflicts`` maps (spot id, date) to the IDs of the bookings in
+    the way. With ``atomic`` nothing is written if anything conflicts.
+    """
+    spot_ids = sorted(spot.pk for spot in spots)
+    dates = sorted(dates)
+    wanted = set(dates)
+    with ExitStack() as stack:
+        for lock in spot_locks(spot_ids):
+            stack.enter_context(lock)
+        stack.enter_context(transaction.atomic())
+        list(ParkingSpot.objects.select_for_update().filter(pk__in=spot_ids).order_by('pk').values_list('pk'))
+
+        conflicts = {}
+        rows = Booking.objects.filter(
+            spot_id__in=spot_ids, bookingDate__range=(dates[0], dates[-1]), startTime__lt=end, endTime__gt=start,
+        ).values_list('pk', 'spot_id', 'bookingDate')
+        for booking_id, spot_id, date in rows:
+            if date in wanted:
+                conflicts.setdefault((spot_id, date), []).append(booking_id)
+        if conflicts and atomic:
+            return [], conflicts
+
+        bookings = Booking.objects.bulk_create([
+            Booking(user_id=user, spot_id=spot, location_id=spot.location_id, city_id_id=spot.location_id.city_id_id,
+                    bookingDate=date, startTime=start, endTime=end)
+            for spot in spots for date in dates if (spot.pk, date) not in conflicts
+        ], batch_size=batch_size)
+
+        # Roll the batch into the occupancy table in one pass, and mark the
+        # bookings as counted so the per-booking post_save handler skips them.
+        occupancy.apply_bookings(
+            (booking.location_id.pk, booking.city_id_id, booking.bookingDate, start, end) for booking in bookings)
+        using = router.db_for_write(Booking)
+        for booking in bookings:
+            booking._loaded_slot = (booking.spot_id_id, booking.location_id.pk, booking.bookingDate, start, end)
+            post_save.send(sender=Booking, instance=booking, created=True, update_fields=None, raw=False, using=using)
+    return bookings, conflicts
@@ -0,0 +1,64 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _version_key(scope):
+    return f'catalog:version:{scope}'
+
+
+def _versions(scopes):
+    cache = _cache()
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Start from the clock rather than 1 so a version key that was
+            # evicted can never come back to a number used before.
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def invalidate(*scopes):
+    cache = _cache()
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            cache.add(_version_key(scope), time.time_ns(), timeout=None)
+
+
+def cached_payload(scopes, name, build):
+    """
+    Return the payload cached under ``name`` for the current versions of
+    ``scopes``, building and storing it on a miss. Writes to the catalog
+    bump the versions (see api/signals.py), which orphans every payload
+    built from the old data in that cache. Processes with their own local
+    memory cache do not see the bump and rely on CATALOG_CACHE_TIMEOUT.
+    """
+    versions = '.'.join(str(version) for version in _versions(scopes))
+    key = f'catalog:{hashlib.md5(name.encode()).hexdigest()}:{versions}'
+    cache = _cache()
+    payload = cache.get(key)
+    with _stats_lock:
+        _stats['hits' if payload is not None else 'misses'] += 1
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 3600))
+    return payload
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
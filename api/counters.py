@@ -0,0 +1,125 @@
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import catalog
+from .models import City, Location, ParkingSpot
+
+_pending = contextvars.ContextVar('spot_counter_deltas', default=None)
+
+
+def add(location_id, total=0, free=0):
+    """
+    Change the spot counters of a location and its city by the given
+    amounts, in the caller's transaction. Inside batched() the deltas are
+    summed and written when the batch ends.
+    """
+    if not (total or free):
+        return
+    pending = _pending.get()
+    if pending is None:
+        _apply({location_id: (total, free)})
+        return
+    current = pending[location_id]
+    pending[location_id] = (current[0] + total, current[1] + free)
+
+
+@contextmanager
+def batched():
+    """Collect add() calls and write them as one update per distinct delta."""
+    if _pending.get() is not None:
+        yield
+        return
+    pending = defaultdict(lambda: (0, 0))
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    _apply(pending)
+
+
+def _adjust(counter, delta):
+    # Never below zero, even if the counters have drifted; reconcile() repairs them.
+    return F(counter) + delta if delta >= 0 else Greatest(F(counter) + delta, Value(0))
+
+
+def _update(model, deltas):
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if any(delta):
+            by_delta[delta].append(pk)
+    for (total, free), pks in by_delta.items():
+        model.objects.filter(pk__in=sorted(pks)).update(
+            totalSpots=_adjust('totalSpots', total), freeSpots=_adjust('freeSpots', free))
+
+
+def _apply(deltas):
+    deltas = {location_id: delta for location_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    city_ids = dict(Location.objects.filter(pk__in=deltas).values_list('pk', 'city_id'))
+    city_deltas = defaultdict(lambda: (0, 0))
+    for location_id, (total, free) in deltas.items():
+        if location_id in city_ids:
+            current = city_deltas[city_ids[location_id]]
+            city_deltas[city_ids[location_id]] = (current[0] + total, current[1] + free)
+    with transaction.atomic():
+        _update(Location, deltas)
+        _update(City, city_deltas)
+    scopes = {'cities', 'locations', *(f'city:{city_id}' for city_id in city_deltas)}
+    transaction.on_commit(lambda: catalog.invalidate(*scopes))
+
+
+def move_location(total, free, old_city_id, new_city_id):
+    """Carry a location's counters over when it moves to another city."""
+    _update(City, {old_city_id: (-total, -free), new_city_id: (total, free)})
+
+
+def _count(queryset, group_by, aggregate):
+    return Coalesce(Subquery(queryset.order_by().values(group_by).annotate(n=aggregate).values('n')), Value(0))
+
+
+def reconcile(city_ids=None):
+    """
+    Recount the counters from ParkingSpot and rewrite the ones that have
+    drifted, limited to ``city_ids`` if given. Returns the number of
+    locations and cities corrected.
+    """
+    spots = ParkingSpot.objects.filter(location_id=OuterRef('pk'))
+    location_counts = {
+        'actual_total': _count(spots, 'location_id', Count('pk')),
+        'actual_free': _count(spots.filter(lsBooked=False), 'location_id', Count('pk')),
+    }
+    locations = Location.objects.filter(city_id=OuterRef('pk'))
+    city_counts = {
+        'actual_total': _count(locations, 'city_id', Sum('totalSpots')),
+        'actual_free': _count(locations, 'city_id', Sum('freeSpots')),
+    }
+    scope = {} if city_ids is None else {'city_id__in': city_ids}
+    city_scope = {} if city_ids is None else {'pk__in': city_ids}
+
+    with transaction.atomic():
+        # Locations first: the city counters are summed from them.
+        drifted_locations = list(
+            Location.objects.filter(**scope).annotate(**location_counts)
+            .exclude(totalSpots=F('actual_total'), freeSpots=F('actual_free'))
+            .values_list('pk', 'city_id'))
+        Location.objects.filter(pk__in=[pk for pk, _ in drifted_locations]).update(
+            totalSpots=location_counts['actual_total'], freeSpots=location_counts['actual_free'])
+        drifted_cities = list(
+            City.objects.filter(**city_scope).annotate(**city_counts)
+            .exclude(totalSpots=F('actual_total'), freeSpots=F('actual_free'))
+            .values_list('pk', flat=True))
+        City.objects.filter(pk__in=drifted_cities).update(
+            totalSpots=city_counts['actual_total'], freeSpots=city_counts['actual_free'])
+
+    if drifted_locations or drifted_cities:
+        scopes = {'cities', 'locations', *(f'city:{city_id}' for _, city_id in drifted_locations),
+                  *(f'city:{city_id}' for city_id in drifted_cities)}
+        transaction.on_commit(lambda: catalog.invalidate(*scopes))
+    return len(drifted_locations), len(drifted_cities)
@@ -0,0 +1,62 @@
+import contextvars
+import functools
+from asyncio import iscoroutinefunction
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+@receiver(connection_created)
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    # SQLITE_PRAGMAS comes from the database profile in settings.py; WAL
+    # lets readers carry on while a writer holds the lock.
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+class ReadReplicaRouter:
+    """
+    Sends reads made inside read_replica() views to the DATABASE_REPLICA_ALIAS
+    database when it is configured; everything else uses the default.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+        if _replica_reads.get() and alias in connections:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the default database.
+        return True
+
+
+def read_replica(view):
+    """Route the ORM reads of a read-only view (sync or async) to the replica."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            token = _replica_reads.set(True)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+    else:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            token = _replica_reads.set(True)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+    return wrapper
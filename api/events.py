@@ -0,0 +1,71 @@
+import asyncio
+import itertools
+import threading
+from collections import defaultdict
+
+
+class AvailabilityBroker:
+    """
+    In-process publish/subscribe of availability changes per location.
+
+    Subscribers are asyncio queues owned by the event loop serving the
+    stream; publishers may run on any thread (signal receivers run in the
+    sync request threads). A subscriber that falls too far behind gets its
+    queue replaced by a single ``resync`` event and is sent a new snapshot.
+    Fine for a single node; every process only sees its own writes.
+    """
+
+    def __init__(self, max_pending=256):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._ids = itertools.count(1)
+
+    def subscribe(self, location_id):
+        queue = asyncio.Queue(self.max_pending)
+        with self._lock:
+            self._subscribers[location_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, location_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(location_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(location_id, None)
+
+    def publish(self, location_id, event):
+        event = {'id': next(self._ids), **event}
+        with self._lock:
+            subscribers = list(self._subscribers.get(location_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # The serving loop is gone; drop the subscriber.
+                self.unsubscribe(location_id, queue)
+
+    @staticmethod
+    def _deliver(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({'id': event['id'], 'type': 'resync'})
+
+
+availability_broker = AvailabilityBroker()
+
+
+def spot_event(spot, deleted=False):
+    return {
+        'type': 'spot',
+        'deleted': deleted,
+        'spot': {
+            'id': spot.pk,
+            'spotNumber': spot.spotNumber,
+            'lsBooked': spot.lsBooked,
+            'location_id': spot.location_id_id,
+        },
+    }
@@ -0,0 +1,92 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import counters
+from .events import availability_broker, spot_event
+from .models import Booking, ParkingSpot
+
+logger = logging.getLogger(__name__)
+
+
+def release_expired_spots(now=None, batch_size=500):
+    """
+    Reset lsBooked on spots whose bookings have all ended by ``now``.
+
+    Booked spots are walked by id in batches (spot_booked_idx), each batch
+    in its own transaction with its rows locked FOR UPDATE SKIP LOCKED, so
+    several sweepers split the work and never wait on a spot that is being
+    booked. A spot is released when it has a booking that ended and none
+    in progress; both checks are EXISTS probes on the booking index, and
+    the release is one UPDATE per batch, plus the free-spot counter updates.
+    Returns the number released.
+    """
+    now = timezone.localtime(now)
+    today, clock = now.date(), now.time()
+    ended = Booking.objects.filter(spot_id=OuterRef('pk')).filter(
+        Q(bookingDate__lt=today) | Q(bookingDate=today, endTime__lte=clock))
+    in_progress = Booking.objects.filter(
+        spot_id=OuterRef('pk'), bookingDate=today, startTime__lte=clock, endTime__gt=clock)
+
+    released, last_id = 0, 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                ParkingSpot.objects.select_for_update(skip_locked=True)
+                .filter(lsBooked=True, pk__gt=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            spots = list(
+                ParkingSpot.objects.filter(pk__in=batch)
+                .filter(Exists(ended)).exclude(Exists(in_progress))
+                .only('spotNumber', 'location_id'))
+            if spots:
+                ParkingSpot.objects.filter(pk__in=[spot.pk for spot in spots]).update(lsBooked=False)
+                with counters.batched():
+                    for spot in spots:
+                        counters.add(spot.location_id_id, free=1)
+                released += len(spots)
+                transaction.on_commit(lambda spots=spots: _publish_released(spots))
+    return released
+
+
+def _publish_released(spots):
+    for spot in spots:
+        spot.lsBooked = False
+        availability_broker.publish(spot.location_id_id, spot_event(spot))
+
+
+def run(interval, batch_size=500, stop=None, report=None):
+    """Sweep every ``interval`` seconds until ``stop`` (a threading.Event) is set."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        started = time.monotonic()
+        try:
+            released = release_expired_spots(batch_size=batch_size)
+        except Exception:
+            logger.exception('Expiry sweep failed')
+        else:
+            if report is not None:
+                report(released, time.monotonic() - started)
+        finally:
+            close_old_connections()
+        stop.wait(max(interval - (time.monotonic() - started), 0))
+
+
+def start_in_process():
+    """Run the sweeper on a daemon thread, so released spots reach this process's event streams."""
+    def report(released, elapsed):
+        logger.info('Released %d spots in %.2fs', released, elapsed)
+
+    thread = threading.Thread(
+        target=run, name='expiry-sweeper', daemon=True,
+        kwargs={'interval': getattr(settings, 'EXPIRY_SWEEPER_INTERVAL', 60), 'report': report})
+    thread.start()
+    return thread
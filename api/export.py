@@ -0,0 +1,90 @@
+import csv
+import heapq
+from operator import itemgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import archive
+from .models import ArchivedBooking, Booking
+
+EXPORT_FIELDS = ('id', 'user_id', 'spot_id', 'location_id', 'city_id', 'bookingDate', 'startTime', 'endTime')
+EXPORT_COLUMNS = ('id', 'user_id_id', 'spot_id_id', 'location_id_id', 'city_id_id', 'bookingDate', 'startTime', 'endTime')
+EXPORT_FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def filter_bookings(date_from=None, date_to=None, city_id=None, location_id=None):
+    """
+    The matching bookings as a list of querysets, one per table to read:
+    Booking, and ArchivedBooking too when the range reaches back past the
+    archive horizon.
+    """
+    models = [Booking, ArchivedBooking] if archive.reaches_archive(date_from) else [Booking]
+    querysets = []
+    for model in models:
+        bookings = model.objects.all()
+        if date_from is not None:
+            bookings = bookings.filter(bookingDate__gte=date_from)
+        if date_to is not None:
+            bookings = bookings.filter(bookingDate__lte=date_to)
+        if location_id is not None:
+            bookings = bookings.filter(spot_id__location_id=location_id)
+        if city_id is not None:
+            bookings = bookings.filter(spot_id__location_id__city_id=city_id)
+        querysets.append(bookings.order_by('id'))
+    return querysets
+
+
+def export_bookings(bookings, output='ndjson', chunk_size=2000):
+    """
+    Yield the bookings (querysets from filter_bookings) as NDJSON or CSV
+    text, one chunk of rows at a time, in id order.
+
+    Rows are read as tuples through ``iterator()`` (a server-side cursor on
+    Postgres), so memory stays flat whatever the size of the export. The
+    tables are merged by id, and a booking read from both while
+    archive_bookings moves it is written once.
+    """
+    rows = _unique_ids(heapq.merge(
+        *(queryset.values_list(*EXPORT_COLUMNS).iterator(chunk_size=chunk_size) for queryset in bookings),
+        key=itemgetter(0)))
+    encode = _ndjson_encoder() if output == 'ndjson' else _csv_encoder()
+    if output == 'csv':
+        yield encode(EXPORT_FIELDS)
+
+    chunk = []
+    for row in rows:
+        chunk.append(encode(row))
+        if len(chunk) == chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _unique_ids(rows):
+    last_id = None
+    for row in rows:
+        if row[0] != last_id:
+            last_id = row[0]
+            yield row
+
+
+def _ndjson_encoder():
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+    def encode(row):
+        return encoder.encode(dict(zip(EXPORT_FIELDS, row))) + '\n'
+    return encode
+
+
+class _LineBuffer:
+    def write(self, value):
+        return value
+
+
+def _csv_encoder():
+    return csv.writer(_LineBuffer()).writerow
@@ -0,0 +1,74 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 9
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        bounds, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Height and width in degrees of a geohash cell of the given precision."""
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the bounding box of the
+    circle. The precision is the finest one whose cells are still larger
+    than the box, so a search touches at most a handful of index ranges.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlon = min(dlat / max(math.cos(math.radians(latitude)), 1e-9), 180.0)
+
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(candidate)
+        if height >= 2 * dlat and width >= 2 * dlon:
+            precision = candidate
+            break
+    height, width = cell_size(precision)
+
+    lat_min, lat_max = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    lon_min, lon_max = longitude - dlon, longitude + dlon
+    cells = set()
+    for lat in _steps(lat_min, lat_max, height):
+        for lon in _steps(lon_min, lon_max, width):
+            wrapped = (lon + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(min(lat, 90.0 - 1e-9), wrapped, precision))
+    return sorted(cells)
+
+
+def _steps(start, stop, step):
+    value = start
+    while value < stop:
+        yield value
+        value += step
+    yield stop
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,155 @@
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import SpotHold
+
+logger = logging.getLogger(__name__)
+
+
+class Hold:
+    def __init__(self, spot_id, user_id, expires_at):
+        self.spot_id = spot_id
+        self.user_id = user_id
+        self.expires_at = expires_at   # Unix time
+
+    def as_dict(self):
+        return {
+            'spot_id': self.spot_id,
+            'expires_at': datetime.datetime.fromtimestamp(self.expires_at, datetime.timezone.utc),
+            'ttl': max(round(self.expires_at - time.time()), 0),
+        }
+
+
+class DatabaseHoldStore:
+    """Holds as SpotHold rows, one per spot; expired rows are ignored and replaced lazily."""
+
+    def acquire(self, spot_id, user_id, ttl):
+        now = timezone.now()
+        expires_at = now + datetime.timedelta(seconds=ttl)
+        SpotHold.objects.filter(spot_id=spot_id, expiresAt__lte=now).delete()
+        try:
+            with transaction.atomic():
+                SpotHold.objects.create(spot_id_id=spot_id, user_id_id=user_id, expiresAt=expires_at)
+        except IntegrityError:
+            # Held already: extend it if it is ours.
+            if not SpotHold.objects.filter(spot_id=spot_id, user_id=user_id).update(expiresAt=expires_at):
+                return self.get(spot_id)
+        return Hold(spot_id, user_id, expires_at.timestamp())
+
+    def get(self, spot_id):
+        hold = SpotHold.objects.filter(spot_id=spot_id, expiresAt__gt=timezone.now()).first()
+        if hold is None:
+            return None
+        return Hold(spot_id, hold.user_id_id, hold.expiresAt.timestamp())
+
+    def holders(self, spot_ids):
+        return dict(SpotHold.objects.filter(
+            spot_id__in=spot_ids, expiresAt__gt=timezone.now()).values_list('spot_id', 'user_id'))
+
+    def release(self, spot_id, user_id):
+        SpotHold.objects.filter(spot_id=spot_id, user_id=user_id).delete()
+
+
+class CacheHoldStore:
+    """
+    Holds as cache entries that expire with the hold. cache.add() is atomic
+    on a shared cache, so at most one user wins a spot. Cache errors fall
+    back to the database store.
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'SPOT_HOLD_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def _key(spot_id):
+        return f'hold:spot:{spot_id}'
+
+    def acquire(self, spot_id, user_id, ttl):
+        try:
+            cache = self._cache()
+            hold = Hold(spot_id, user_id, time.time() + ttl)
+            for _ in range(2):
+                if cache.add(self._key(spot_id), (user_id, hold.expires_at), ttl):
+                    return hold
+                current = self.get(spot_id)
+                if current is not None and current.user_id == user_id:
+                    cache.set(self._key(spot_id), (user_id, hold.expires_at), ttl)
+                    return hold
+                if current is not None:
+                    return current
+                # Expired between add() and get(); try again.
+            return self.get(spot_id) or hold
+        except Exception:
+            logger.exception('Spot hold cache unavailable, using the database')
+            return self.fallback.acquire(spot_id, user_id, ttl)
+
+    def get(self, spot_id):
+        try:
+            value = self._cache().get(self._key(spot_id))
+        except Exception:
+            return self.fallback.get(spot_id)
+        if value is None or value[1] <= time.time():
+            return None
+        return Hold(spot_id, *value)
+
+    def holders(self, spot_ids):
+        try:
+            found = self._cache().get_many([self._key(spot_id) for spot_id in spot_ids])
+        except Exception:
+            return self.fallback.holders(spot_ids)
+        now = time.time()
+        return {
+            spot_id: found[self._key(spot_id)][0]
+            for spot_id in spot_ids
+            if self._key(spot_id) in found and found[self._key(spot_id)][1] > now
+        }
+
+    def release(self, spot_id, user_id):
+        try:
+            current = self.get(spot_id)
+            if current is not None and current.user_id == user_id:
+                self._cache().delete(self._key(spot_id))
+        except Exception:
+            self.fallback.release(spot_id, user_id)
+
+
+_database_store = DatabaseHoldStore()
+_cache_store = CacheHoldStore(_database_store)
+
+
+def _store():
+    return _cache_store if getattr(settings, 'SPOT_HOLD_STORE', 'database') == 'cache' else _database_store
+
+
+def acquire(spot_id, user_id, ttl=None):
+    """
+    Hold ``spot_id`` for ``user_id``, or extend the user's hold. Returns the
+    Hold now in place, which belongs to another user if the spot was taken.
+    """
+    return _store().acquire(spot_id, user_id, ttl or getattr(settings, 'SPOT_HOLD_TTL', 120))
+
+
+def holder(spot_id):
+    hold = _store().get(spot_id)
+    return hold.user_id if hold is not None else None
+
+
+def held_by_others(spot_ids, user_id):
+    """The spots among ``spot_ids`` that another user is holding."""
+    if not spot_ids:
+        return set()
+    return {spot_id for spot_id, holder_id in _store().holders(spot_ids).items() if holder_id != user_id}
+
+
+def release(spot_id, user_id):
+    _store().release(spot_id, user_id)
@@ -0,0 +1,106 @@
+import datetime
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+
+
+def _ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+
+
+def _lease():
+    return getattr(settings, 'IDEMPOTENCY_PENDING_LEASE', 60)
+
+
+def _request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _claim(scope, key, request_hash):
+    """
+    Insert the in-progress record, or return the one already stored. The
+    claim only lasts the pending lease, so a worker that dies mid-request
+    does not lock the key for the whole TTL.
+    """
+    now = timezone.now()
+    expires_at = now + datetime.timedelta(seconds=_lease())
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                IdempotencyRecord.objects.create(
+                    scope=scope, key=key, requestHash=request_hash, expiresAt=expires_at)
+            return None
+        except IntegrityError:
+            existing = IdempotencyRecord.objects.filter(scope=scope, key=key).first()
+            if existing is not None and existing.expiresAt > now:
+                return existing
+            # Expired (or deleted meanwhile): drop it and claim the key afresh.
+            IdempotencyRecord.objects.filter(scope=scope, key=key, expiresAt__lte=now).delete()
+    return IdempotencyRecord.objects.get(scope=scope, key=key)
+
+
+def idempotent(view):
+    """
+    Replay the stored response when a request repeats the Idempotency-Key
+    of an earlier one from the same user, instead of running the view
+    again. The key is claimed with a unique insert before the view runs,
+    so a concurrent duplicate gets 409 rather than a second write. A key
+    reused with a different request body gets 422. Server errors are not
+    stored, so the client can retry them with the same key. Keys are
+    scoped per user, so keyed requests must be authenticated.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request = args[0] if isinstance(args[0], Request) else args[1]
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not 0 < len(key) <= 255:
+            return Response({'error': f'{HEADER} must be 1 to 255 characters.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not request.user.is_authenticated:
+            return Response({'error': f'Sign in to use {HEADER}.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        scope, request_hash = f'user:{request.user.pk}', _request_hash(request)
+        existing = _claim(scope, key, request_hash)
+        if existing is not None:
+            if existing.requestHash != request_hash:
+                return Response({'error': f'{HEADER} was already used for a different request.'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if existing.statusCode is None:
+                return Response({'error': f'A request with this {HEADER} is still being processed.'},
+                                status=status.HTTP_409_CONFLICT)
+            return Response(existing.responseBody, status=existing.statusCode,
+                            headers={'Idempotent-Replayed': 'true'})
+
+        record = IdempotencyRecord.objects.filter(scope=scope, key=key)
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            record.delete()
+        else:
+            record.update(statusCode=response.status_code, responseBody=response.data,
+                          expiresAt=timezone.now() + datetime.timedelta(seconds=_ttl()))
+        return response
+
+    return wrapper
+
+
+def purge_expired():
+    return IdempotencyRecord.objects.filter(expiresAt__lte=timezone.now()).delete()[0]
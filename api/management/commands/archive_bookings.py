@@ -0,0 +1,22 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from api import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Move bookings older than the archive horizon (BOOKING_ARCHIVE_HORIZON_DAYS) '
+        'from Booking to ArchivedBooking, in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=datetime.date.fromisoformat,
+                            help='Archive bookings dated before this day instead of the horizon.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        before = options['before'] or archive.horizon()
+        moved = archive.archive_bookings(before, batch_size=options['batch_size'])
+        self.stdout.write(f'Archived {moved} bookings dated before {before}.')
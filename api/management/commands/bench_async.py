@@ -0,0 +1,79 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient
+
+from api.benchmarking import summarize
+from api.models import Booking, City, Location
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync and async read endpoints under concurrent load on '
+        'one ASGI worker, using in-process ASGI requests.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and concurrency level.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+
+    def handle(self, *args, **options):
+        city = City.objects.first()
+        location = Location.objects.first()
+        booking = Booking.objects.first()
+        if city is None or location is None:
+            raise CommandError('Needs at least one city and location in the database (see seed_data).')
+
+        endpoints = [
+            ('cities', 'get', '/get-all-cities/', None),
+            ('locations-by-city', 'post', '/get-locations-by-city/', {'city_id': city.pk}),
+            ('spots-by-location', 'post', '/get-spot-numbers-by-location/', {'location_id': location.pk}),
+        ]
+        if booking is not None:
+            endpoints.append(('booking-detail', 'get', f'/bookings/{booking.pk}/', None))
+
+        results = []
+        for concurrency in options['concurrency']:
+            for name, method, path, payload in endpoints:
+                for flavour, prefix in (('sync', ''), ('async', '/async')):
+                    stats = asyncio.run(self._run(
+                        method, prefix + path, payload, options['requests'], concurrency))
+                    results.append({'endpoint': name, 'flavour': flavour, 'concurrency': concurrency, **stats})
+                    self.stderr.write(
+                        f"{name:<18} {flavour:<5} c={concurrency:<4} "
+                        f"{stats['throughput']:>8.1f} req/s  p50 {stats['p50_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms"
+                    )
+        self.stdout.write(json.dumps(results, indent=2))
+
+    async def _run(self, method, path, payload, total, concurrency):
+        client = AsyncClient(headers={'host': 'localhost'})
+        latencies = []
+        errors = 0
+        remaining = iter(range(total))
+
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                if method == 'get':
+                    response = await client.get(path)
+                else:
+                    response = await client.post(path, payload, content_type='application/json')
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        # Drop connections opened by the async ORM's worker threads.
+        await sync_to_async(_close_connections)()
+        return summarize(latencies, elapsed, errors)
+
+
+def _close_connections():
+    from django.db import connections
+    connections.close_all()
@@ -0,0 +1,58 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.field_plans import field_plan
+from api.models import City, Location, ParkingSpot
+from api.serializers import ParkingSpotSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare ParkingSpotSerializer(many=True) with the field-plan fast path '
+        'on a temporary table of parking spots, checking the rendered JSON is '
+        'byte-identical. The spots are rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spots', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path; the best one is reported.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            city = City.objects.create(cityName='Serializer bench')
+            location = Location.objects.create(locationName='Serializer bench', city_id=city)
+            ParkingSpot.objects.bulk_create([
+                ParkingSpot(spotNumber=f'B{number:06d}', location_id=location, lsBooked=number % 3 == 0)
+                for number in range(options['spots'])
+            ], batch_size=5000)
+            queryset = ParkingSpot.objects.filter(location_id=location).order_by('id')
+            plan = field_plan(ParkingSpotSerializer)
+
+            drf_time, drf_body = self._best(options['repeat'], lambda: ParkingSpotSerializer(queryset, many=True).data)
+            plan_time, plan_body = self._best(options['repeat'], lambda: plan.serialize(plan.values_list(queryset)))
+            transaction.set_rollback(True)
+
+        if drf_body != plan_body:
+            raise CommandError('The field plan rendered different JSON from ParkingSpotSerializer.')
+        report = {
+            'spots': options['spots'],
+            'serializer_s': round(drf_time, 4),
+            'field_plan_s': round(plan_time, 4),
+            'speedup': round(drf_time / plan_time, 2),
+            'bytes': len(plan_body),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def _best(self, repeat, serialize):
+        # Query, serialization and rendering together, as a request pays them.
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = JSONRenderer().render(serialize())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, body
@@ -0,0 +1,168 @@
+import datetime
+import json
+import platform
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.benchmarking import summarize
+from api.models import Booking, City, Location, ParkingSpot, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the main API endpoints in-process (with query counts) and, '
+        'with --url, concurrently over HTTP. Prints a JSON report.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint.')
+        parser.add_argument('--endpoints', nargs='+', help='Only run these endpoints.')
+        parser.add_argument('--url', help='Base URL of a running server for the HTTP run.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Threads for the HTTP run.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--compare', help='Earlier JSON report to print p50/p99/throughput ratios against.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        endpoints = self._endpoints(rng)
+        if options['endpoints']:
+            endpoints = {name: endpoints[name] for name in options['endpoints']}
+
+        results = []
+        for name, make_request in endpoints.items():
+            results.append(self._run_in_process(name, make_request, options['requests']))
+            if options['url']:
+                results.append(self._run_http(
+                    name, make_request, options['requests'], options['url'], options['concurrency']))
+            for result in results[-2 if options['url'] else -1:]:
+                self.stderr.write(
+                    f"{result['endpoint']:<22} {result['mode']:<10} {result['throughput']:>8.1f} req/s  "
+                    f"p50 {result['p50_ms']:.2f}  p95 {result['p95_ms']:.2f}  p99 {result['p99_ms']:.2f} ms  "
+                    f"queries {result.get('queries_per_request', '-')}  errors {result['errors']}"
+                )
+
+        report = {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'dataset': {
+                'cities': City.objects.count(),
+                'locations': Location.objects.count(),
+                'spots': ParkingSpot.objects.count(),
+                'bookings': Booking.objects.count(),
+            },
+            'results': results,
+        }
+        if options['compare']:
+            self._compare(report, options['compare'])
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as out:
+                out.write(output)
+        self.stdout.write(output)
+
+    def _endpoints(self, rng):
+        city_ids = list(City.objects.values_list('id', flat=True)[:1000])
+        location_ids = list(Location.objects.values_list('id', flat=True)[:1000])
+        spot_ids = list(ParkingSpot.objects.values_list('id', flat=True)[:1000])
+        booking_ids = list(Booking.objects.values_list('id', flat=True)[:1000])
+        user = User.objects.filter(is_active=True).first()
+        if not (city_ids and location_ids and spot_ids and booking_ids and user):
+            raise CommandError('The database has no data to benchmark; run seed_data first.')
+        token = str(RefreshToken.for_user(user).access_token)
+        day = datetime.date(2030, 1, 1)
+
+        def window():
+            start = rng.randrange(8 * 60, 20 * 60, 15)
+            return {
+                'bookingDate': (day + datetime.timedelta(days=rng.randrange(365))).isoformat(),
+                'startTime': f'{start // 60:02d}:{start % 60:02d}',
+                'endTime': f'{(start + 60) // 60:02d}:{start % 60:02d}',
+            }
+
+        # Each entry returns (method, path, json payload, headers, accepted statuses).
+        return {
+            'get-all-cities': lambda: ('get', '/get-all-cities/', None, {}, {200}),
+            'cities-page': lambda: ('get', '/cities/', None, {}, {200}),
+            'locations-by-city': lambda: (
+                'post', '/get-locations-by-city/', {'city_id': rng.choice(city_ids)}, {}, {200}),
+            'spots-by-location': lambda: (
+                'post', '/get-spot-numbers-by-location/', {'location_id': rng.choice(location_ids)}, {}, {200}),
+            'spots-for-window': lambda: (
+                'post', '/get-spot-numbers-by-location/',
+                {'location_id': rng.choice(location_ids), **window()}, {}, {200}),
+            'parking-spots-page': lambda: ('get', '/parking-spots/', None, {}, {200}),
+            'bookings-page': lambda: ('get', '/bookings/', None, {}, {200}),
+            'booking-detail': lambda: ('get', f'/bookings/{rng.choice(booking_ids)}/', None, {}, {200}),
+            'create-booking': lambda: (
+                'post', '/create_booking/', {'spot_id': rng.choice(spot_ids), **window()},
+                {'Authorization': f'Bearer {token}'}, {201, 409}),
+        }
+
+    def _run_in_process(self, name, make_request, total):
+        client = Client(headers={'host': 'localhost'})
+        latencies, errors, queries = [], 0, 0
+        started = time.perf_counter()
+        for _ in range(total):
+            method, path, payload, headers, accepted = make_request()
+            request_started = time.perf_counter()
+            with CaptureQueriesContext(connection) as captured:
+                if method == 'get':
+                    response = client.get(path, headers=headers)
+                else:
+                    response = client.post(path, payload, content_type='application/json', headers=headers)
+            latencies.append(time.perf_counter() - request_started)
+            queries += len(captured)
+            errors += response.status_code not in accepted
+        result = summarize(latencies, time.perf_counter() - started, errors)
+        return {'endpoint': name, 'mode': 'in-process', **result, 'queries_per_request': queries / total}
+
+    def _run_http(self, name, make_request, total, base_url, concurrency):
+        local = threading.local()
+        lock = threading.Lock()
+        latencies, errors = [], 0
+
+        def send(_):
+            nonlocal errors
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            method, path, payload, headers, accepted = make_request()
+            request_started = time.perf_counter()
+            response = session.request(method, base_url.rstrip('/') + path, json=payload, headers=headers)
+            elapsed = time.perf_counter() - request_started
+            with lock:
+                latencies.append(elapsed)
+                errors += response.status_code not in accepted
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(send, range(total)))
+        result = summarize(latencies, time.perf_counter() - started, errors)
+        return {'endpoint': name, 'mode': f'http-c{concurrency}', **result}
+
+    def _compare(self, report, path):
+        with open(path) as baseline_file:
+            baseline = {(r['endpoint'], r['mode']): r for r in json.load(baseline_file)['results']}
+        for result in report['results']:
+            before = baseline.get((result['endpoint'], result['mode']))
+            if before is None:
+                continue
+            result['vs_baseline'] = {
+                key: round(result[key] / before[key], 3) if before[key] else None
+                for key in ('p50_ms', 'p99_ms', 'throughput')
+            }
+            self.stderr.write(
+                f"{result['endpoint']:<22} {result['mode']:<10} vs baseline: "
+                + '  '.join(f'{key} x{value}' for key, value in result['vs_baseline'].items())
+            )
@@ -0,0 +1,33 @@
+import datetime
+import sys
+
+from django.core.management.base import BaseCommand
+
+from api.export import EXPORT_FORMATS, export_bookings, filter_bookings
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings as NDJSON or CSV to stdout or a file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--file', help='Write to this path instead of stdout.')
+        parser.add_argument('--date-from', type=datetime.date.fromisoformat)
+        parser.add_argument('--date-to', type=datetime.date.fromisoformat)
+        parser.add_argument('--city-id', type=int)
+        parser.add_argument('--location-id', type=int)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        bookings = filter_bookings(
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            city_id=options['city_id'],
+            location_id=options['location_id'],
+        )
+        chunks = export_bookings(bookings, output=options['output'], chunk_size=options['chunk_size'])
+        if options['file']:
+            with open(options['file'], 'w', newline='') as out:
+                out.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
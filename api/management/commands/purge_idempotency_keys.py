@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from api.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses that are past IDEMPOTENCY_KEY_TTL.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Deleted {purge_expired()} expired idempotency records.')
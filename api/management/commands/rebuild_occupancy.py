@@ -0,0 +1,18 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from api import occupancy
+
+
+class Command(BaseCommand):
+    help = 'Recompute the hourly location occupancy rollup from bookings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=datetime.date.fromisoformat)
+        parser.add_argument('--date-to', type=datetime.date.fromisoformat)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        written = occupancy.rebuild(options['date_from'], options['date_to'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} occupancy rows.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount the totalSpots/freeSpots counters on Location and City from '
+        'ParkingSpot and fix any that have drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', type=int, action='append', dest='city_ids',
+                            help='Only this city; repeat for several.')
+
+    def handle(self, *args, **options):
+        locations, cities = reconcile(city_ids=options['city_ids'])
+        self.stdout.write(f'Corrected {locations} locations and {cities} cities.')
@@ -0,0 +1,97 @@
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import counters, occupancy
+from api.models import Booking, City, Location, ParkingSpot, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Insert a synthetic dataset (cities, locations, spots, users, bookings) '
+        'with bulk inserts, for benchmarks and load tests.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cities', type=int, default=10)
+        parser.add_argument('--locations-per-city', type=int, default=20)
+        parser.add_argument('--spots-per-location', type=int, default=50)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--bookings', type=int, default=100000)
+        parser.add_argument('--start-date', type=datetime.date.fromisoformat, default=datetime.date(2026, 1, 1))
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default='Bench@1234', help='Password of every seeded user.')
+        parser.add_argument('--skip-occupancy', action='store_true', help='Do not rebuild the occupancy rollup.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        # Seeded rows get a run-specific prefix so seeding twice does not
+        # collide on the unique user columns.
+        run = f"{options['seed']}-{City.objects.count()}"
+
+        with transaction.atomic():
+            cities = City.objects.bulk_create(
+                [City(cityName=f'City {run}-{number}') for number in range(options['cities'])],
+                batch_size=batch_size)
+
+            locations = []
+            for city in cities:
+                latitude, longitude = rng.uniform(8, 32), rng.uniform(68, 92)
+                for number in range(options['locations_per_city']):
+                    location = Location(
+                        locationName=f'{city.cityName} Lot {number}', city_id=city,
+                        location_latitude=latitude + rng.uniform(-0.2, 0.2),
+                        location_longitude=longitude + rng.uniform(-0.2, 0.2))
+                    location.update_geohash()
+                    locations.append(location)
+            locations = Location.objects.bulk_create(locations, batch_size=batch_size)
+
+            spots = ParkingSpot.objects.bulk_create([
+                ParkingSpot(spotNumber=f'{level}{number:03d}', location_id=location, lsBooked=rng.random() < 0.3)
+                for location in locations
+                for level, number in ((chr(65 + n // 100), n % 100) for n in range(options['spots_per_location']))
+            ], batch_size=batch_size)
+            # bulk_create skips the signals that keep the spot counters.
+            counters.reconcile(city_ids=[city.pk for city in cities])
+
+            password = make_password(options['password'])
+            users = User.objects.bulk_create([
+                User(username=f'bench-{run}-{number}', email=f'bench-{run}-{number}@example.com',
+                     phone_number=f'9{run}{number}', password=password,
+                     first_name='Bench', last_name=str(number))
+                for number in range(options['users'])
+            ], batch_size=batch_size)
+        self.stderr.write(
+            f'{len(cities)} cities, {len(locations)} locations, {len(spots)} spots, {len(users)} users')
+
+        self._seed_bookings(rng, spots, users, options)
+        if not options['skip_occupancy']:
+            occupancy.rebuild(date_from=options['start_date'])
+
+    def _seed_bookings(self, rng, spots, users, options):
+        # Booking n takes the next free one-hour slot (08:00-20:00) of spot
+        # n % len(spots), so the data set has no overlaps.
+        total, batch_size = options['bookings'], options['batch_size']
+        if not spots or not users:
+            return
+        created = 0
+        while created < total:
+            batch = []
+            for number in range(created, min(created + batch_size, total)):
+                spot = spots[number % len(spots)]
+                slot = number // len(spots)
+                start = datetime.time(8 + slot % 12)
+                batch.append(Booking(
+                    user_id=rng.choice(users), spot_id=spot,
+                    location_id_id=spot.location_id_id, city_id_id=spot.location_id.city_id_id,
+                    bookingDate=options['start_date'] + datetime.timedelta(days=slot // 12),
+                    startTime=start, endTime=start.replace(hour=start.hour + 1)))
+            with transaction.atomic():
+                Booking.objects.bulk_create(batch, batch_size=batch_size)
+            created += len(batch)
+            self.stderr.write(f'{created}/{total} bookings')
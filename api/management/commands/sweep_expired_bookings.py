@@ -0,0 +1,32 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from api import expiry
+
+
+class Command(BaseCommand):
+    help = (
+        'Release parking spots whose bookings have ended, every --interval '
+        'seconds until interrupted. Safe to run on several nodes at once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between sweeps.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--once', action='store_true', help='Sweep once and exit.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self._report(expiry.release_expired_spots(batch_size=options['batch_size']), None)
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        expiry.run(options['interval'], options['batch_size'], stop=stop, report=self._report)
+
+    def _report(self, released, elapsed):
+        timing = f' in {elapsed:.2f}s' if elapsed is not None else ''
+        self.stdout.write(f'Released {released} spots{timing}.')
@@ -0,0 +1,130 @@
+import contextvars
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('api.profiling')
+
+_profile = contextvars.ContextVar('request_profile', default=None)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+
+def sql_shape(sql):
+    """The statement with literals and IN lists collapsed, to spot repeats."""
+    return _LISTS.sub('(?)', _LITERALS.sub('?', sql))
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serialize_db_time = 0.0
+        self.serializing = False
+        self.shapes = Counter()
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        profile.queries += 1
+        profile.db_time += elapsed
+        if profile.serializing:
+            profile.serialize_db_time += elapsed
+        profile.shapes[sql_shape(sql)] += 1
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Count the block as serializer time of the request being profiled. Used
+    by ProfiledSerializerMixin (api/serializers.py); nested serializations
+    are already inside the outer one and are not counted again.
+    """
+    profile = _profile.get()
+    if profile is None or profile.serializing:
+        yield
+        return
+    profile.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.serialize_time += time.perf_counter() - started
+        profile.serializing = False
+
+
+class RequestProfilingMiddleware:
+    """
+    Records query count, DB time, serializer time and the remaining view
+    time of every request (serializers are timed through
+    ProfiledSerializerMixin), and reports them in a Server-Timing header and a
+    JSON log line on the ``api.profiling`` logger. SQL shapes repeated more
+    than REQUEST_PROFILING_REPEAT_THRESHOLD times are logged as a likely
+    N+1. Enabled with REQUEST_PROFILING; keep it last in MIDDLEWARE so the
+    timings cover the view only.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.repeat_threshold = getattr(settings, 'REQUEST_PROFILING_REPEAT_THRESHOLD', 5)
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_record_query))
+                response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        total = time.perf_counter() - started
+
+        db_ms = profile.db_time * 1000
+        serialize_ms = (profile.serialize_time - profile.serialize_db_time) * 1000
+        view_ms = max(total * 1000 - db_ms - serialize_ms, 0.0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.2f};desc="{profile.queries} queries"',
+            f'serialize;dur={serialize_ms:.2f}',
+            f'view;dur={view_ms:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+        repeated = {shape: count for shape, count in profile.shapes.items() if count > self.repeat_threshold}
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': profile.queries,
+            'db_ms': round(db_ms, 2),
+            'serialize_ms': round(serialize_ms, 2),
+            'view_ms': round(view_ms, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        if repeated:
+            record['repeated_queries'] = [
+                {'sql': shape, 'count': count}
+                for shape, count in sorted(repeated.items(), key=lambda item: -item[1])
+            ]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+        return response
@@ -0,0 +1,82 @@
+import math
+
+import django.core.validators
+from django.db import migrations, models
+
+from api.geo import encode_geohash
+
+
+def _to_float(value, limit):
+    # Anything that is not a finite coordinate within +-limit degrees
+    # ('nan', 'inf', a latitude of 95) becomes NULL, like a missing one.
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) and -limit <= value <= limit else None
+
+
+def coordinates_to_float(apps, schema_editor):
+    Location = apps.get_model('api', 'Location')
+    db_alias = schema_editor.connection.alias
+    locations = list(Location.objects.using(db_alias))
+    for location in locations:
+        location.latitude = _to_float(location.location_latitude, 90)
+        location.longitude = _to_float(location.location_longitude, 180)
+        if location.latitude is not None and location.longitude is not None:
+            location.geohash = encode_geohash(location.latitude, location.longitude)
+    Location.objects.using(db_alias).bulk_update(locations, ['latitude', 'longitude', 'geohash'], batch_size=500)
+
+
+def coordinates_to_text(apps, schema_editor):
+    Location = apps.get_model('api', 'Location')
+    db_alias = schema_editor.connection.alias
+    locations = list(Location.objects.using(db_alias))
+    for location in locations:
+        location.location_latitude = None if location.latitude is None else str(location.latitude)
+        location.location_longitude = None if location.longitude is None else str(location.longitude)
+    Location.objects.using(db_alias).bulk_update(locations, ['location_latitude', 'location_longitude'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)], verbose_name='Latitude'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='Longitude'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(coordinates_to_float, coordinates_to_text),
+        migrations.RemoveField(
+            model_name='location',
+            name='location_latitude',
+        ),
+        migrations.RemoveField(
+            model_name='location',
+            name='location_longitude',
+        ),
+        migrations.RenameField(
+            model_name='location',
+            old_name='latitude',
+            new_name='location_latitude',
+        ),
+        migrations.RenameField(
+            model_name='location',
+            old_name='longitude',
+            new_name='location_longitude',
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_location_numeric_coordinates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='spot_id',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='api.parkingspot'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='user_id',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='parkingspot',
+            name='location_id',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.location'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(max_length=254, unique=True, verbose_name='email address'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='phone_number',
+            field=models.CharField(max_length=20, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['spot_id', 'bookingDate', 'startTime'], name='booking_spot_date_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user_id', 'bookingDate'], name='booking_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(fields=['location_id', 'lsBooked'], name='spot_location_booked_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_booking_and_login_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('bookedMinutes', models.IntegerField(default=0)),
+                ('city_id', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='api.city')),
+                ('location_id', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='api.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['city_id', 'date', 'hour'], name='occupancy_city_hour_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='locationoccupancy',
+            constraint=models.UniqueConstraint(fields=('location_id', 'date', 'hour'), name='occupancy_location_hour_uniq'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_location_occupancy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(condition=models.Q(('lsBooked', True)), fields=['id'], name='spot_booked_idx'),
+        ),
+    ]
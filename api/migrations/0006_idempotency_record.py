@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:25
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_parkingspot_booked_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=64)),
+                ('key', models.CharField(max_length=255)),
+                ('requestHash', models.CharField(max_length=64)),
+                ('statusCode', models.PositiveSmallIntegerField(null=True)),
+                ('responseBody', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('expiresAt', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencyrecord',
+            constraint=models.UniqueConstraint(fields=('scope', 'key'), name='idempotency_scope_key_uniq'),
+        ),
+    ]
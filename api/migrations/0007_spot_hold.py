@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_idempotency_record'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpotHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('expiresAt', models.DateTimeField()),
+                ('spot_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='hold', to='api.parkingspot')),
+                ('user_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spot_holds', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
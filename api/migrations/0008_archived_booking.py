@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_spot_hold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('bookingDate', models.DateField()),
+                ('startTime', models.TimeField()),
+                ('endTime', models.TimeField()),
+                ('city_id', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.city')),
+                ('location_id', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.location')),
+                ('spot_id', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='api.parkingspot')),
+                ('user_id', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bookingDate'], name='archived_booking_date_idx'), models.Index(fields=['user_id', 'bookingDate'], name='archived_booking_user_date_idx'), models.Index(fields=['spot_id', 'bookingDate'], name='archived_booking_spot_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, group_by, aggregate):
+    return Coalesce(Subquery(queryset.order_by().values(group_by).annotate(n=aggregate).values('n')), Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    City = apps.get_model('api', 'City')
+    Location = apps.get_model('api', 'Location')
+    ParkingSpot = apps.get_model('api', 'ParkingSpot')
+    spots = ParkingSpot.objects.using(db_alias).filter(location_id=OuterRef('pk'))
+    Location.objects.using(db_alias).update(
+        totalSpots=_count(spots, 'location_id', Count('pk')),
+        freeSpots=_count(spots.filter(lsBooked=False), 'location_id', Count('pk')))
+    locations = Location.objects.using(db_alias).filter(city_id=OuterRef('pk'))
+    City.objects.using(db_alias).update(
+        totalSpots=_count(locations, 'city_id', Sum('totalSpots')),
+        freeSpots=_count(locations, 'city_id', Sum('freeSpots')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_archived_booking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='city',
+            name='freeSpots',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='city',
+            name='totalSpots',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='freeSpots',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='totalSpots',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
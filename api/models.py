@@ -1,9 +1,30 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
 from django.contrib.auth.models import AbstractUser
 
+from .geo import encode_geohash
+
+# Maintained with F() updates by api/counters.py, never by Model.save().
+SPOT_COUNTER_FIELDS = ('totalSpots', 'freeSpots')
+
+
+def _keep_spot_counters(instance, kwargs):
+    # A full save would write back the counters as loaded, undoing any F()
+    # update made since; leave them out unless the row is being inserted.
+    if instance._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None:
+        return
+    kwargs['update_fields'] = [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in SPOT_COUNTER_FIELDS
+    ]
+
 class User(AbstractUser):
-    phone_number=models.CharField(max_length=20)
+    email = models.EmailField('email address', unique=True)
+    phone_number=models.CharField(max_length=20, unique=True)
+
+    REQUIRED_FIELDS = ['email', 'phone_number']
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -11,27 +32,79 @@ class User(AbstractUser):
 
 class City(models.Model):
     cityName = models.CharField(max_length=255)
+    # Sums of the location counters, maintained by api/counters.py.
+    totalSpots = models.PositiveIntegerField(default=0, editable=False)
+    freeSpots = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.cityName
 
+    def save(self, *args, **kwargs):
+        _keep_spot_counters(self, kwargs)
+        super().save(*args, **kwargs)
+
 
 class Location(models.Model):
     locationName = models.CharField(max_length=255)
     city_id = models.ForeignKey(City, on_delete=models.CASCADE)
-    location_latitude = models.CharField('Latitude', max_length=20, null=True, blank=True)
-    location_longitude = models.CharField('Longitude', max_length=20, null=True, blank=True)
+    location_latitude = models.FloatField(
+        'Latitude', null=True, blank=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    location_longitude = models.FloatField(
+        'Longitude', null=True, blank=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
+    # Spots here and how many have lsBooked unset, maintained by api/counters.py.
+    totalSpots = models.PositiveIntegerField(default=0, editable=False)
+    freeSpots = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.locationName
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so a move to another city invalidates both city listings.
+        instance._loaded_city_id = instance.__dict__.get('city_id_id')
+        return instance
+
+    def update_geohash(self):
+        if self.location_latitude is None or self.location_longitude is None:
+            self.geohash = ''
+        else:
+            self.geohash = encode_geohash(float(self.location_latitude), float(self.location_longitude))
+
+    def save(self, *args, **kwargs):
+        self.update_geohash()
+        _keep_spot_counters(self, kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'location_latitude', 'location_longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
     
 
 
 class ParkingSpot(models.Model):
     spotNumber = models.CharField(max_length=50)
-    location_id = models.ForeignKey(Location, on_delete=models.CASCADE)
+    # Indexed through spot_location_booked_idx, which leads with location_id.
+    location_id = models.ForeignKey(Location, on_delete=models.CASCADE, db_index=False)
     lsBooked = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['location_id', 'lsBooked'], name='spot_location_booked_idx'),
+            # Only the booked spots, which the expiry sweeper walks by id.
+            models.Index(fields=['id'], condition=models.Q(lsBooked=True), name='spot_booked_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_location_id = instance.__dict__.get('location_id_id')
+        # What the location's spot counters currently count for this spot.
+        instance._loaded_booked = instance.__dict__.get('lsBooked')
+        return instance
+
     def __str__(self):
         return self.spotNumber
 
@@ -60,14 +133,100 @@ class CarDetail(models.Model):
 class Booking(models.Model):
     city_id = models.ForeignKey(City, on_delete=models.CASCADE, null=True, blank=True, default=None)
     location_id = models.ForeignKey(Location, on_delete=models.CASCADE, null=True, blank=True, default=None)
-    user_id = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
-    spot_id = models.ForeignKey(ParkingSpot, on_delete=models.CASCADE, related_name='bookings')
+    # user_id and spot_id are indexed through the composite indexes below.
+    user_id = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings', db_index=False)
+    spot_id = models.ForeignKey(ParkingSpot, on_delete=models.CASCADE, related_name='bookings', db_index=False)
     bookingDate = models.DateField()
     startTime = models.TimeField()
     endTime = models.TimeField()
-   
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['spot_id', 'bookingDate', 'startTime'], name='booking_spot_date_start_idx'),
+            models.Index(fields=['user_id', 'bookingDate'], name='booking_user_date_idx'),
+        ]
 
     def __str__(self):
         return f"Booking #- {self.user_id.first_name} {self.user_id.last_name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the occupancy rollup currently counts for this booking: the
+        # spot's location is filled in once the booking has been saved.
+        instance._loaded_slot = (
+            instance.__dict__.get('spot_id_id'), None,
+            *(instance.__dict__.get(name) for name in ('bookingDate', 'startTime', 'endTime')))
+        return instance
+
+
+class ArchivedBooking(models.Model):
+    """Past bookings moved out of Booking by archive_bookings, with their original IDs."""
+    id = models.BigIntegerField(primary_key=True)
+    city_id = models.ForeignKey(City, on_delete=models.CASCADE, null=True, blank=True, default=None)
+    location_id = models.ForeignKey(Location, on_delete=models.CASCADE, null=True, blank=True, default=None)
+    user_id = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_bookings', db_index=False)
+    spot_id = models.ForeignKey(ParkingSpot, on_delete=models.CASCADE, related_name='archived_bookings', db_index=False)
+    bookingDate = models.DateField()
+    startTime = models.TimeField()
+    endTime = models.TimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bookingDate'], name='archived_booking_date_idx'),
+            models.Index(fields=['user_id', 'bookingDate'], name='archived_booking_user_date_idx'),
+            models.Index(fields=['spot_id', 'bookingDate'], name='archived_booking_spot_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived booking #{self.pk}"
+
+
+class LocationOccupancy(models.Model):
+    """Booked minutes per location and hour, kept up to date by api/occupancy.py."""
+    location_id = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='occupancy', db_index=False)
+    city_id = models.ForeignKey(City, on_delete=models.CASCADE, related_name='occupancy', db_index=False)
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    bookedMinutes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['location_id', 'date', 'hour'], name='occupancy_location_hour_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['city_id', 'date', 'hour'], name='occupancy_city_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.location_id_id} {self.date} {self.hour:02d}:00 - {self.bookedMinutes} min"
     
+
+
+class IdempotencyRecord(models.Model):
+    """The first response to a request sent with an Idempotency-Key, see api/idempotency.py."""
+    scope = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    requestHash = models.CharField(max_length=64)
+    # Null while the first request is still being handled.
+    statusCode = models.PositiveSmallIntegerField(null=True)
+    responseBody = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    expiresAt = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
+
+class SpotHold(models.Model):
+    """A checkout hold on a spot, for the database store in api/holds.py."""
+    spot_id = models.OneToOneField(ParkingSpot, on_delete=models.CASCADE, related_name='hold')
+    user_id = models.ForeignKey(User, on_delete=models.CASCADE, related_name='spot_holds')
+    expiresAt = models.DateTimeField()
+
+    def __str__(self):
+        return f"Hold on {self.spot_id_id} for {self.user_id_id}"
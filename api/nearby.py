@@ -0,0 +1,50 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from .geo import covering_cells, haversine_km
+from .models import Location
+
+# Starting radius and ceiling for k-nearest searches without a radius.
+KNN_START_RADIUS_KM = 1.0
+KNN_MAX_RADIUS_KM = 20037.5
+
+
+def locations_within(latitude, longitude, radius_km):
+    """(distance_km, location id) for every location in the circle, nearest first."""
+    cells = covering_cells(latitude, longitude, radius_km)
+    # Prefix matches as half-open ranges so the geohash index is used on
+    # every backend (LIKE 'prefix%' is not indexable on SQLite).
+    in_cells = reduce(or_, (Q(geohash__gte=cell, geohash__lt=cell + '~') for cell in cells))
+    candidates = Location.objects.filter(in_cells).values_list(
+        'id', 'location_latitude', 'location_longitude')
+    found = []
+    for location_id, lat, lon in candidates:
+        distance = haversine_km(latitude, longitude, lat, lon)
+        if distance <= radius_km:
+            found.append((distance, location_id))
+    found.sort()
+    return found
+
+
+def nearest_locations(latitude, longitude, k, radius_km=None):
+    """
+    The k nearest locations, optionally limited to radius_km. Without a
+    radius the search circle doubles until it holds k locations; anything
+    outside the circle is farther than everything inside it, so the result
+    is exact.
+    """
+    if radius_km is not None:
+        found = locations_within(latitude, longitude, radius_km)
+    else:
+        radius = KNN_START_RADIUS_KM
+        found = locations_within(latitude, longitude, radius)
+        while len(found) < k and radius < KNN_MAX_RADIUS_KM:
+            radius = min(radius * 2, KNN_MAX_RADIUS_KM)
+            found = locations_within(latitude, longitude, radius)
+    found = found[:k]
+
+    locations = Location.objects.filter(id__in=[location_id for _, location_id in found])
+    by_id = {location.id: location for location in locations}
+    return [(distance, by_id[location_id]) for distance, location_id in found]
@@ -0,0 +1,176 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .models import ArchivedBooking, Booking, Location, LocationOccupancy, ParkingSpot
+
+
+def hourly_minutes(date, start, end):
+    """Split a booking into (date, hour, minutes) buckets."""
+    if start is None or end is None or start >= end:
+        return []
+    start_minute = start.hour * 60 + start.minute
+    end_minute = end.hour * 60 + end.minute
+    buckets = []
+    for hour in range(start.hour, 24):
+        minutes = min(end_minute, (hour + 1) * 60) - max(start_minute, hour * 60)
+        if minutes <= 0:
+            break
+        buckets.append((date, hour, minutes))
+    return buckets
+
+
+def apply_booking(spot_id, location_id, date, start, end, sign):
+    """
+    Add (sign=1) or remove (sign=-1) one booking's minutes from the rollup
+    of ``location_id``, or of the spot's location when that is not known.
+    """
+    buckets = hourly_minutes(date, start, end)
+    if not buckets:
+        return
+    if location_id is None:
+        place = ParkingSpot.objects.filter(pk=spot_id).values_list('location_id', 'location_id__city_id').first()
+    else:
+        place = Location.objects.filter(pk=location_id).values_list('pk', 'city_id').first()
+    if place is None:
+        return
+    location_id, city_id = place
+    for date, hour, minutes in buckets:
+        _add_minutes(location_id, city_id, date, hour, sign * minutes)
+
+
+def move_spot(spot_id, old_location_id, new_location_id):
+    """Carry the minutes of a spot's bookings, archived ones included, to its new location."""
+    columns = ('bookingDate', 'startTime', 'endTime')
+    slots = list(Booking.objects.filter(spot_id=spot_id).values_list(*columns).union(
+        ArchivedBooking.objects.filter(spot_id=spot_id).values_list(*columns), all=True))
+    if not slots:
+        return
+    cities = dict(Location.objects.filter(pk__in=[old_location_id, new_location_id]).values_list('pk', 'city_id'))
+    if old_location_id in cities:
+        totals = defaultdict(int)
+        for date, start, end in slots:
+            for _, hour, minutes in hourly_minutes(date, start, end):
+                totals[(date, hour)] += minutes
+        for (date, hour), minutes in totals.items():
+            _add_minutes(old_location_id, cities[old_location_id], date, hour, -minutes)
+    if new_location_id in cities:
+        apply_bookings((new_location_id, cities[new_location_id], date, start, end) for date, start, end in slots)
+
+
+def move_location(location_id, city_id):
+    """Count a location's minutes under the city it has moved to."""
+    LocationOccupancy.objects.filter(location_id=location_id).update(city_id=city_id)
+
+
+def apply_bookings(slots):
+    """
+    Add many new bookings at once, given as (location_id, city_id, date,
+    startTime, endTime). Minutes are summed per hour first; existing rollup
+    rows get one update each and missing ones are inserted together.
+    """
+    totals = defaultdict(int)
+    for location_id, city_id, date, start, end in slots:
+        for _, hour, minutes in hourly_minutes(date, start, end):
+            totals[(location_id, city_id, date, hour)] += minutes
+    if not totals:
+        return
+
+    dates = [key[2] for key in totals]
+    existing = set(LocationOccupancy.objects.filter(
+        location_id__in={key[0] for key in totals}, date__range=(min(dates), max(dates)),
+    ).values_list('location_id', 'date', 'hour'))
+    missing = {}
+    for (location_id, city_id, date, hour), minutes in totals.items():
+        if (location_id, date, hour) in existing:
+            _add_minutes(location_id, city_id, date, hour, minutes)
+        else:
+            missing[(location_id, city_id, date, hour)] = minutes
+    try:
+        with transaction.atomic():
+            LocationOccupancy.objects.bulk_create([
+                LocationOccupancy(location_id_id=location_id, city_id_id=city_id, date=date, hour=hour,
+                                  bookedMinutes=minutes)
+                for (location_id, city_id, date, hour), minutes in missing.items()
+            ])
+    except IntegrityError:
+        # Some rows were created by a concurrent writer; fall back to one at a time.
+        for key, minutes in missing.items():
+            _add_minutes(*key, minutes)
+
+
+def _add_minutes(location_id, city_id, date, hour, minutes):
+    rows = LocationOccupancy.objects.filter(location_id=location_id, date=date, hour=hour)
+    if rows.update(bookedMinutes=F('bookedMinutes') + minutes) or minutes < 0:
+        return
+    try:
+        with transaction.atomic():
+            LocationOccupancy.objects.create(
+                location_id_id=location_id, city_id_id=city_id, date=date, hour=hour, bookedMinutes=minutes)
+    except IntegrityError:
+        # Created by a concurrent writer since the update above.
+        rows.update(bookedMinutes=F('bookedMinutes') + minutes)
+
+
+def rebuild(date_from=None, date_to=None, batch_size=2000):
+    """
+    Recompute the rollup from the Booking and ArchivedBooking tables, one
+    booking date at a time so memory only holds a day of buckets. Returns
+    the rows written.
+    """
+    bookings = Booking.objects.all()
+    archived = ArchivedBooking.objects.all()
+    rollup = LocationOccupancy.objects.all()
+    if date_from is not None:
+        bookings = bookings.filter(bookingDate__gte=date_from)
+        archived = archived.filter(bookingDate__gte=date_from)
+        rollup = rollup.filter(date__gte=date_from)
+    if date_to is not None:
+        bookings = bookings.filter(bookingDate__lte=date_to)
+        archived = archived.filter(bookingDate__lte=date_to)
+        rollup = rollup.filter(date__lte=date_to)
+
+    columns = ('spot_id__location_id', 'spot_id__location_id__city_id', 'bookingDate', 'startTime', 'endTime')
+    rows = bookings.values_list(*columns).union(
+        archived.values_list(*columns), all=True,
+    ).order_by('bookingDate').iterator(chunk_size=batch_size)
+
+    written = 0
+    with transaction.atomic():
+        rollup.delete()
+        day, totals = None, defaultdict(int)
+        for location_id, city_id, date, start, end in rows:
+            if date != day:
+                written += _write_day(totals, batch_size)
+                day, totals = date, defaultdict(int)
+            for _, hour, minutes in hourly_minutes(date, start, end):
+                totals[(location_id, city_id, date, hour)] += minutes
+        written += _write_day(totals, batch_size)
+    return written
+
+
+def _write_day(totals, batch_size):
+    LocationOccupancy.objects.bulk_create([
+        LocationOccupancy(location_id_id=location_id, city_id_id=city_id, date=date, hour=hour, bookedMinutes=minutes)
+        for (location_id, city_id, date, hour), minutes in totals.items()
+    ], batch_size=batch_size)
+    return len(totals)
+
+
+def occupancy(location_id=None, city_id=None, date_from=None, date_to=None, granularity='hour'):
+    rows = LocationOccupancy.objects.all()
+    if location_id is not None:
+        rows = rows.filter(location_id=location_id)
+    if city_id is not None:
+        rows = rows.filter(city_id=city_id)
+    if date_from is not None:
+        rows = rows.filter(date__gte=date_from)
+    if date_to is not None:
+        rows = rows.filter(date__lte=date_to)
+    group_by = ('date', 'hour') if granularity == 'hour' else ('date',)
+    totals = rows.values(*group_by).annotate(total=Sum('bookedMinutes')).order_by(*group_by)
+    return [
+        {**{name: row[name] for name in group_by}, 'bookedMinutes': row['total']}
+        for row in totals
+    ]
@@ -0,0 +1,245 @@
+import logging
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import City, Location
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text):
+    """Accents stripped, case folded and whitespace collapsed: 'São  Paulo' -> 'sao paulo'."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def _one_edit_variants(prefix, alphabet):
+    """Every string one deletion, substitution, insertion or transposition away from ``prefix``."""
+    variants = set()
+    for position in range(len(prefix)):
+        head, char, tail = prefix[:position], prefix[position], prefix[position + 1:]
+        variants.add(head + tail)
+        if tail:
+            variants.add(head + tail[0] + char + tail[1:])
+        for other in alphabet:
+            if other != char:
+                variants.add(head + other + char + tail)
+                variants.add(head + other + tail)
+    variants.discard(prefix)
+    return variants
+
+
+class NameIndex:
+    """
+    Per-process prefix index over city and location names.
+
+    Every word start of a normalized name is a key ('station road' is
+    found by 'sta' and by 'ro'), kept in a sorted list next to the
+    (kind, id) it belongs to; a prefix lookup is a bisect and a scan of the
+    matching run. Whole-name keys and later-word keys are separate lists so
+    the ones matching from the start of the name can be ranked first.
+
+    The index is built on first use (or by warm() at startup) and kept in
+    sync by the City and Location signals in api/signals.py; the TTL bounds
+    staleness from writes made by other processes. Builds read the tables
+    and sort outside the lock and only swap the result in, so an expired
+    index is refreshed from a background thread while searches keep using
+    the old one.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'NAME_INDEX_TTL', 300)
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()   # one build at a time
+        self._built_at = None
+        self._refreshing = False
+        self._journal = None         # changes made while a build runs, replayed onto its result
+        self._lists = ([], [])       # whole-name keys, later-word keys: ([key], [(kind, id)])
+        self._entries = {}           # (kind, id) -> (name, city_id, normalized name)
+        self._alphabet = set()
+
+    def search(self, query, k=10, kinds=('city', 'location')):
+        """
+        Up to ``k`` names starting with ``query``, or with a word starting
+        with it, ranked by: exact before one-edit prefix matches, name start
+        before a later word, cities before locations, then alphabetically.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self._ensure_built()
+        with self._lock:
+            found = {}
+            self._collect(prefix, 0, k, kinds, found)
+            # Typo tolerance only when the exact prefix has too few matches,
+            # and never for one-letter queries, where any name is one edit away.
+            if len(found) < k and len(prefix) > 1:
+                for variant in _one_edit_variants(prefix, self._alphabet):
+                    self._collect(variant, 1, k, kinds, found)
+            ranked = sorted(found.items(), key=lambda item: item[1])[:k]
+            return [self._result(ref) for ref, _ in ranked]
+
+    def update(self, kind, pk, name, city_id=None):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((kind, pk, name, city_id))
+            if self._built_at is not None:
+                self._remove(kind, pk)
+                self._add(kind, pk, name, city_id)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((kind, pk, None, None))
+            if self._built_at is not None:
+                self._remove(kind, pk)
+
+    def warm(self):
+        with self._build_lock:
+            self._build()
+
+    def clear(self):
+        with self._lock:
+            self._built_at = None
+            self._lists = ([], [])
+            self._entries = {}
+            self._alphabet = set()
+
+    def _ensure_built(self):
+        if self._built_at is None:
+            # Nothing to serve yet: build now, or wait for the build under way.
+            with self._build_lock:
+                if self._built_at is None:
+                    self._build()
+            return
+        with self._lock:
+            expired = time.monotonic() - self._built_at >= self.ttl and not self._refreshing
+            if expired:
+                self._refreshing = True
+        if expired:
+            threading.Thread(target=self._refresh, name='name-index-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            with self._build_lock:
+                self._build()
+        except Exception:
+            logger.exception('Could not refresh the name index')
+        finally:
+            with self._lock:
+                self._refreshing = False
+            close_old_connections()
+
+    def _build(self):
+        with self._lock:
+            self._journal = []
+        try:
+            lists, entries, alphabet = self._load()
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._lists, self._entries, self._alphabet = lists, entries, alphabet
+            self._built_at = time.monotonic()
+            # Writes committed while the tables were read may be missing
+            # from the result; apply them again.
+            for kind, pk, name, city_id in journal:
+                self._remove(kind, pk)
+                if name is not None:
+                    self._add(kind, pk, name, city_id)
+
+    def _load(self):
+        entries = {
+            ('city', pk): (name, None, normalize(name))
+            for pk, name in City.objects.values_list('id', 'cityName')
+        }
+        entries.update(
+            (('location', pk), (name, city_id, normalize(name)))
+            for pk, name, city_id in Location.objects.values_list('id', 'locationName', 'city_id'))
+        rows = ([], [])
+        alphabet = set()
+        for ref, (_, _, normalized) in entries.items():
+            for position, key in enumerate(self._keys(normalized)):
+                rows[position > 0].append((key, ref))
+                alphabet.update(key)
+        lists = []
+        for keyed in rows:
+            keyed.sort()
+            lists.append(([key for key, _ in keyed], [ref for _, ref in keyed]))
+        return tuple(lists), entries, alphabet
+
+    @staticmethod
+    def _keys(normalized):
+        words = normalized.split(' ')
+        return [' '.join(words[start:]) for start in range(len(words))]
+
+    def _add(self, kind, pk, name, city_id):
+        ref = (kind, pk)
+        normalized = normalize(name)
+        self._entries[ref] = (name, city_id, normalized)
+        for position, key in enumerate(self._keys(normalized)):
+            keys, refs = self._lists[position > 0]
+            index = bisect_left(keys, key)
+            keys.insert(index, key)
+            refs.insert(index, ref)
+            self._alphabet.update(key)
+
+    def _remove(self, kind, pk):
+        ref = (kind, pk)
+        found = self._entries.pop(ref, None)
+        if found is None:
+            return
+        for position, key in enumerate(self._keys(found[2])):
+            keys, refs = self._lists[position > 0]
+            index = bisect_left(keys, key)
+            while index < len(keys) and keys[index] == key:
+                if refs[index] == ref:
+                    del keys[index], refs[index]
+                    break
+                index += 1
+
+    def _collect(self, prefix, edits, k, kinds, found):
+        for later_word, (keys, refs) in enumerate(self._lists):
+            index = bisect_left(keys, prefix)
+            taken = 0
+            while taken < k and index < len(keys) and keys[index].startswith(prefix):
+                ref = refs[index]
+                index += 1
+                if ref[0] not in kinds:
+                    continue
+                rank = (edits, later_word, ref[0] != 'city', self._entries[ref][2], ref[1])
+                if ref not in found or rank < found[ref]:
+                    found[ref] = rank
+                taken += 1
+
+    def _result(self, ref):
+        kind, pk = ref
+        name, city_id, _ = self._entries[ref]
+        result = {'type': kind, 'id': pk, 'name': name}
+        if kind == 'location':
+            result['city_id'] = city_id
+        return result
+
+
+name_index = NameIndex()
+
+
+def warm_in_background():
+    """Build the name index off the startup path, so the first search does not pay for it."""
+    def warm():
+        try:
+            name_index.warm()
+        except Exception:
+            logger.exception('Could not build the name index')
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=warm, name='name-index-warm', daemon=True).start()
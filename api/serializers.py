@@ -1,43 +1,403 @@
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework.validators import UniqueValidator
+import datetime
 import re
+from . import counters
+from .export import EXPORT_FORMATS
+from .middleware import timed_serialization
 from .models import City, Location, ParkingSpot, User, Booking, CarDetail
+from django.db import router, transaction
 from django.db.models import Q
+from django.db.models.signals import post_save
 from django.contrib.auth.hashers import make_password, check_password
 
 
 
-class CitySerializer(serializers.ModelSerializer):
+class ProfiledSerializerMixin:
+    """Reports the time spent in ``.data`` to RequestProfilingMiddleware."""
+
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
+
+
+class ProfiledListSerializer(ProfiledSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class SparseFieldsMixin:
+    """Drops the fields not named in context['fields'] (see sparse_fields()); 'id' is always kept."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = self.context.get('fields')
+        if wanted:
+            for name in [name for name in self.fields if name != 'id' and name not in wanted]:
+                self.fields.pop(name)
+
+
+def sparse_fields(query_params, serializer_class):
+    """The ?fields= selection for serializer_class as a set; empty means every field."""
+    wanted = {name.strip() for name in query_params.get('fields', '').split(',') if name.strip()}
+    unknown = wanted - set(serializer_class().fields) - set(getattr(serializer_class, 'expanded_fields', ()))
+    if unknown:
+        raise ValidationError({'fields': [f"Unknown fields: {', '.join(sorted(unknown))}."]})
+    return wanted
+
+
+def sparse_queryset(queryset, fields, keep=()):
+    """Load only the columns behind ``fields`` and ``keep``, plus the primary key the cursor needs."""
+    if not fields:
+        return queryset
+    columns = {field.name for field in queryset.model._meta.concrete_fields}
+    return queryset.only('id', *((set(fields) | set(keep)) & columns))
+
+
+class CitySerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = City
         fields = '__all__'
+        list_serializer_class = ProfiledListSerializer
 
 
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Location
         fields = '__all__'
+        list_serializer_class = ProfiledListSerializer
 
-class ParkingSpotSerializer(serializers.ModelSerializer):
+class ParkingSpotSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ParkingSpot
         fields = '__all__'
+        list_serializer_class = ProfiledListSerializer
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # Resolves against the objects BulkListSerializer fetched for the whole
+    # batch, falling back to a query (and its error messages) on a miss.
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.field_name)
+        if prefetched is not None and not isinstance(data, bool):
+            try:
+                return prefetched[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+class BulkListSerializer(ProfiledListSerializer):
+    """
+    Validates a list of records with one query per related model and writes
+    them with bulk_create/bulk_update in a single transaction. post_save is
+    sent for every written object so signal receivers stay in sync.
+    """
+    batch_size = 500
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self._prefetch_related(data)
+            if self.instance is not None:
+                self._check_ids(data)
+        return super().to_internal_value(data)
+
+    def _prefetch_related(self, data):
+        prefetched = {}
+        for name, field in self.child.fields.items():
+            if isinstance(field, BulkPrimaryKeyRelatedField) and not field.read_only:
+                pks = {item.get(name) for item in data if isinstance(item, dict)}
+                pks = [pk for pk in pks if isinstance(pk, int) or (isinstance(pk, str) and pk.isdigit())]
+                prefetched[name] = field.get_queryset().in_bulk(pks)
+        self.context['prefetched'] = prefetched
+
+    def _check_ids(self, data):
+        known = {obj.pk for obj in self.instance}
+        errors = [
+            {} if isinstance(item, dict) and item.get('id') in known
+            else {'id': ['Provide the id of an existing record.']}
+            for item in data
+        ]
+        if any(errors):
+            raise ValidationError(errors)
+
+    # Fields that prepare() derives and bulk_update has to write as well.
+    derived_fields = ()
+
+    def prepare(self, obj):
+        # bulk_create/bulk_update skip Model.save(); set derived values here.
+        return obj
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        with transaction.atomic():
+            objs = model.objects.bulk_create(
+                [self.prepare(model(**attrs)) for attrs in validated_data], batch_size=self.batch_size)
+            self._send_post_save(model, objs, created=True)
+        return objs
+
+    def update(self, instances, validated_data):
+        model = self.child.Meta.model
+        by_id = {obj.pk: obj for obj in instances}
+        objs, fields = [], set()
+        for item, attrs in zip(self.initial_data, validated_data):
+            obj = by_id[item['id']]
+            for name, value in attrs.items():
+                setattr(obj, name, value)
+            fields.update(attrs)
+            objs.append(self.prepare(obj))
+        if fields:
+            fields.update(self.derived_fields)
+        with transaction.atomic():
+            if fields:
+                model.objects.bulk_update(objs, fields, batch_size=self.batch_size)
+            self._send_post_save(model, objs, created=False)
+        return objs
+
+    def _send_post_save(self, model, objs, created):
+        using = router.db_for_write(model)
+        # One counter update per location for the whole batch, not per row.
+        with counters.batched():
+            for obj in objs:
+                post_save.send(sender=model, instance=obj, created=created, update_fields=None, raw=False, using=using)
+
+
+class LocationBulkListSerializer(BulkListSerializer):
+    derived_fields = ('geohash',)
+
+    def prepare(self, obj):
+        obj.update_geohash()
+        return obj
+
+
+class LocationBulkSerializer(serializers.ModelSerializer):
+    serializer_related_field = BulkPrimaryKeyRelatedField
 
-class UserSerializer(serializers.ModelSerializer):
     class Meta:
-        model = User
+        model = Location
         fields = '__all__'
+        list_serializer_class = LocationBulkListSerializer
+
+
+class ParkingSpotBulkSerializer(serializers.ModelSerializer):
+    serializer_related_field = BulkPrimaryKeyRelatedField
 
-class BookingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ParkingSpot
+        fields = '__all__'
+        list_serializer_class = BulkListSerializer
+
+
+class UserSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = User
+        exclude = ['password', 'groups', 'user_permissions']
+        list_serializer_class = ProfiledListSerializer
+
+BOOKING_EXPANSIONS = ('spot', 'location', 'city', 'car')
+
+
+class BookingSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    # context['expand'] nests related objects in place of their IDs and adds
+    # the user's cars as car_details; anything left out by ?fields= stays
+    # out. The queryset should come from expand_bookings() so that nothing
+    # here queries per booking. A booking without its own location or city
+    # falls back to the spot's.
     class Meta:
         model = Booking
         fields = '__all__'
+        list_serializer_class = ProfiledListSerializer
 
+    # Not model fields, but ?fields= may name them.
+    expanded_fields = ('car_details',)
 
-class CarDetailSerializer(serializers.ModelSerializer):
+    def validate(self, data):
+        start = data.get('startTime', getattr(self.instance, 'startTime', None))
+        end = data.get('endTime', getattr(self.instance, 'endTime', None))
+        if start is not None and end is not None and start >= end:
+            raise serializers.ValidationError('startTime must be before endTime.')
+        return data
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        expand = self.context.get('expand', ())
+        if not expand:
+            return data
+        location = instance.location_id or instance.spot_id.location_id
+        if 'spot' in expand and 'spot_id' in data:
+            data['spot_id'] = ParkingSpotSerializer(instance.spot_id).data
+        if 'location' in expand and 'location_id' in data:
+            data['location_id'] = LocationSerializer(location).data
+        if 'city' in expand and 'city_id' in data:
+            data['city_id'] = CitySerializer(instance.city_id or location.city_id).data
+        wanted = self.context.get('fields')
+        if 'car' in expand and (not wanted or 'car_details' in wanted):
+            data['car_details'] = CarDetailSerializer(instance.user_id.car_details.all(), many=True).data
+        return data
+
+
+BOOKING_RELATIONS = ('city_id', 'location_id', 'user_id', 'spot_id')
+
+
+def expand_bookings(queryset, expand):
+    """
+    Join or prefetch what BookingSerializer needs for the given expansions.
+    Pass BOOKING_RELATIONS as ``keep`` to sparse_queryset() when expanding.
+    """
+    related = set()
+    if expand:
+        related.update(['location_id', 'spot_id__location_id'])
+    if 'spot' in expand:
+        related.add('spot_id')
+    if 'city' in expand:
+        related.update(['city_id', 'location_id__city_id', 'spot_id__location_id__city_id'])
+    if 'car' in expand:
+        related.add('user_id')
+        queryset = queryset.prefetch_related('user_id__car_details')
+    return queryset.select_related(*sorted(related)) if related else queryset
+
+
+class OwnBookingSerializer(BookingSerializer):
+    # The owner is the authenticated user, passed to save() by the view.
+    class Meta(BookingSerializer.Meta):
+        read_only_fields = ['user_id']
+
+
+class BookingRecurrenceSerializer(serializers.Serializer):
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6), required=False, allow_empty=False,
+        help_text='Days of the week to book, 0 = Monday. Every day if omitted.')
+
+    def validate(self, data):
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError('start_date must not be after end_date.')
+        if (data['end_date'] - data['start_date']).days > 366:
+            raise serializers.ValidationError('A recurrence can span at most a year.')
+        return data
+
+    @staticmethod
+    def dates(data):
+        weekdays = set(data.get('weekdays', range(7)))
+        day = data['start_date']
+        while day <= data['end_date']:
+            if day.weekday() in weekdays:
+                yield day
+            day += datetime.timedelta(days=1)
+
+
+class BatchBookingSerializer(serializers.Serializer):
+    max_occurrences = 5000
+
+    spot_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=200)
+    startTime = serializers.TimeField()
+    endTime = serializers.TimeField()
+    dates = serializers.ListField(child=serializers.DateField(), required=False, allow_empty=False)
+    recurrence = BookingRecurrenceSerializer(required=False)
+    atomic = serializers.BooleanField(
+        default=True, help_text='Book all occurrences or none; otherwise book the free ones.')
+
+    def validate_spot_ids(self, value):
+        spots = ParkingSpot.objects.select_related('location_id').in_bulk(set(value))
+        missing = sorted(set(value) - set(spots))
+        if missing:
+            raise serializers.ValidationError(f"Unknown parking spots: {', '.join(map(str, missing))}.")
+        return [spots[spot_id] for spot_id in sorted(spots)]
+
+    def validate(self, data):
+        if data['startTime'] >= data['endTime']:
+            raise serializers.ValidationError('startTime must be before endTime.')
+        if 'dates' not in data and 'recurrence' not in data:
+            raise serializers.ValidationError('Provide dates, a recurrence, or both.')
+        dates = set(data.get('dates', []))
+        if 'recurrence' in data:
+            dates.update(BookingRecurrenceSerializer.dates(data['recurrence']))
+        if not dates:
+            raise serializers.ValidationError('The recurrence does not produce any dates.')
+        if len(dates) * len(data['spot_ids']) > self.max_occurrences:
+            raise serializers.ValidationError(f'A batch can hold at most {self.max_occurrences} bookings.')
+        data['dates'] = sorted(dates)
+        return data
+
+
+class SpotHoldSerializer(serializers.Serializer):
+    spot_id = serializers.PrimaryKeyRelatedField(queryset=ParkingSpot.objects.all())
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    location_id = serializers.IntegerField()
+    bookingDate = serializers.DateField(required=False)
+    startTime = serializers.TimeField(required=False)
+    endTime = serializers.TimeField(required=False)
+
+    def validate(self, data):
+        window = [name in data for name in ('bookingDate', 'startTime', 'endTime')]
+        if any(window) and not all(window):
+            raise serializers.ValidationError('bookingDate, startTime and endTime must be provided together.')
+        if all(window) and data['startTime'] >= data['endTime']:
+            raise serializers.ValidationError('startTime must be before endTime.')
+        return data
+
+
+class NearbyLocationQuerySerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    radius_km = serializers.FloatField(required=False, min_value=0.01, max_value=20000)
+    k = serializers.IntegerField(default=10, min_value=1, max_value=100)
+
+
+class AutocompleteQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    k = serializers.IntegerField(default=10, min_value=1, max_value=50)
+    type = serializers.ChoiceField(choices=['city', 'location'], required=False)
+
+
+class OccupancyQuerySerializer(serializers.Serializer):
+    location_id = serializers.IntegerField(required=False)
+    city_id = serializers.IntegerField(required=False)
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    granularity = serializers.ChoiceField(choices=['hour', 'day'], default='hour')
+
+    def validate(self, data):
+        if 'location_id' not in data and 'city_id' not in data:
+            raise serializers.ValidationError('Provide location_id or city_id.')
+        if data['date_from'] > data['date_to']:
+            raise serializers.ValidationError('date_from must not be after date_to.')
+        return data
+
+
+class BookingExpandQuerySerializer(serializers.Serializer):
+    expand = serializers.CharField(required=False, default='',
+                                   help_text='Comma-separated: ' + ', '.join(BOOKING_EXPANSIONS))
+
+    def validate_expand(self, value):
+        expand = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = expand - set(BOOKING_EXPANSIONS)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown expansions: {', '.join(sorted(unknown))}.")
+        return expand
+
+
+class BookingListQuerySerializer(BookingExpandQuerySerializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+
+class BookingExportQuerySerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=EXPORT_FORMATS, default='ndjson')
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    city_id = serializers.IntegerField(required=False)
+    location_id = serializers.IntegerField(required=False)
+
+
+class CarDetailSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CarDetail
         fields = '__all__'
+        list_serializer_class = ProfiledListSerializer
 
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -47,7 +407,11 @@ class RegistrationSerializer(serializers.ModelSerializer):
         model = User
         fields = ['first_name', 'last_name', 'email', 'phone_number', 'password', 'password2']
         extra_kwargs = {
-            'password': {'write_only': True}
+            'password': {'write_only': True},
+            'email': {'validators': [UniqueValidator(
+                queryset=User.objects.all(), message='User with this email already exists.')]},
+            'phone_number': {'validators': [UniqueValidator(
+                queryset=User.objects.all(), message='User with this phone_number already exists.')]},
         }
 
     def validate_password(self, password):
@@ -69,12 +433,8 @@ class RegistrationSerializer(serializers.ModelSerializer):
         email = validated_data['email']
         phone_number = validated_data['phone_number']
 
-        if User.objects.filter(email=email).exists():
-            raise ValidationError({'email': ['User with this email already exists.']})
-        
-        if User.objects.filter(phone_number=phone_number).exists():
-            raise ValidationError({'phone_number': ['User with this phone_number already exists.']})
-
+        # Uniqueness of email and phone_number is checked by the field
+        # validators against the unique indexes.
         user = User.objects.create(
             email=email,
             phone_number=phone_number,
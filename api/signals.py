@@ -0,0 +1,232 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import catalog, counters, occupancy
+from .archive import is_archiving
+from .authentication import forget_user
+from .availability import availability_index
+from .events import availability_broker, spot_event
+from .models import Booking, City, Location, ParkingSpot, User
+from .search import name_index
+
+
+def _booking_field(instance, name):
+    return Booking._meta.get_field(name).to_python(getattr(instance, name))
+
+
+def _booking_slot(instance):
+    return (
+        instance.spot_id_id,
+        instance.spot_id.location_id_id,
+        _booking_field(instance, 'bookingDate'),
+        _booking_field(instance, 'startTime'),
+        _booking_field(instance, 'endTime'),
+    )
+
+
+@receiver(post_save, sender=Booking)
+def index_booking(sender, instance, **kwargs):
+    args = (
+        instance.pk,
+        instance.spot_id.location_id_id,
+        instance.spot_id_id,
+        _booking_field(instance, 'bookingDate'),
+        _booking_field(instance, 'startTime'),
+        _booking_field(instance, 'endTime'),
+    )
+    transaction.on_commit(lambda: availability_index.add_booking(*args))
+
+
+@receiver(post_delete, sender=Booking)
+def unindex_booking(sender, instance, **kwargs):
+    booking_id = instance.pk
+    transaction.on_commit(lambda: availability_index.remove_booking(booking_id))
+
+
+@receiver(post_save, sender=ParkingSpot)
+def reindex_spot_location(sender, instance, created, **kwargs):
+    # A spot moved to another location brings its bookings along.
+    if not created:
+        location_id = instance.location_id_id
+        transaction.on_commit(lambda: availability_index.invalidate_location(location_id))
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def invalidate_cities(sender, instance, **kwargs):
+    transaction.on_commit(lambda: catalog.invalidate('cities'))
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_locations(sender, instance, **kwargs):
+    scopes = {'locations', f'city:{instance.city_id_id}'}
+    old_city_id = getattr(instance, '_loaded_city_id', None)
+    if old_city_id is not None:
+        scopes.add(f'city:{old_city_id}')
+    transaction.on_commit(lambda: catalog.invalidate(*scopes))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def uncache_user(sender, instance, **kwargs):
+    # Again after commit, in case a request cached the old row meanwhile.
+    user_id = instance.pk
+    forget_user(user_id)
+    transaction.on_commit(lambda: forget_user(user_id))
+
+
+def _booking_event(booking, deleted=False):
+    return {
+        'type': 'booking',
+        'deleted': deleted,
+        'booking': {
+            'id': booking.pk,
+            'spot_id': booking.spot_id_id,
+            'bookingDate': str(_booking_field(booking, 'bookingDate')),
+            'startTime': str(_booking_field(booking, 'startTime')),
+            'endTime': str(_booking_field(booking, 'endTime')),
+        },
+    }
+
+
+@receiver(post_save, sender=ParkingSpot)
+def publish_spot_saved(sender, instance, **kwargs):
+    event = spot_event(instance)
+    location_id = instance.location_id_id
+    old_location_id = getattr(instance, '_loaded_location_id', None)
+
+    def publish():
+        availability_broker.publish(location_id, event)
+        if old_location_id not in (None, location_id):
+            availability_broker.publish(old_location_id, spot_event(instance, deleted=True))
+    transaction.on_commit(publish)
+
+
+@receiver(post_delete, sender=ParkingSpot)
+def publish_spot_deleted(sender, instance, **kwargs):
+    event = spot_event(instance, deleted=True)
+    location_id = instance.location_id_id
+    transaction.on_commit(lambda: availability_broker.publish(location_id, event))
+
+
+@receiver(post_save, sender=Booking)
+def publish_booking_saved(sender, instance, **kwargs):
+    event = _booking_event(instance)
+    location_id = instance.spot_id.location_id_id
+    transaction.on_commit(lambda: availability_broker.publish(location_id, event))
+
+
+@receiver(post_delete, sender=Booking)
+def publish_booking_deleted(sender, instance, **kwargs):
+    if is_archiving():
+        return
+    event = _booking_event(instance, deleted=True)
+    try:
+        location_id = instance.spot_id.location_id_id
+    except ParkingSpot.DoesNotExist:
+        return
+    transaction.on_commit(lambda: availability_broker.publish(location_id, event))
+
+
+@receiver(post_save, sender=Booking)
+def update_occupancy(sender, instance, **kwargs):
+    # Same transaction as the booking write, so the rollup never drifts.
+    slot = _booking_slot(instance)
+    loaded = getattr(instance, '_loaded_slot', None)
+    if loaded is not None and loaded[1] is None:
+        # Loaded from the database: its location is the spot's, as the spot
+        # move handler keeps the rollup in step with it.
+        loaded = (loaded[0], slot[1], *loaded[2:]) if loaded[0] == slot[0] else loaded
+    if loaded == slot:
+        instance._loaded_slot = slot
+        return
+    if loaded is not None:
+        occupancy.apply_booking(*loaded, sign=-1)
+    occupancy.apply_booking(*slot, sign=1)
+    instance._loaded_slot = slot
+
+
+@receiver(post_delete, sender=Booking)
+def remove_occupancy(sender, instance, **kwargs):
+    # Archived bookings still count towards the rollup.
+    if is_archiving():
+        return
+    occupancy.apply_booking(*getattr(instance, '_loaded_slot', None) or _booking_slot(instance), sign=-1)
+
+
+@receiver(pre_save, sender=ParkingSpot)
+def load_spot_snapshot(sender, instance, **kwargs):
+    # Spots saved without being loaded first (ParkingSpot(pk=...).save())
+    # need the stored row to know what the counters hold for them.
+    if instance._state.adding or hasattr(instance, '_loaded_booked'):
+        return
+    stored = ParkingSpot.objects.filter(pk=instance.pk).values_list('location_id', 'lsBooked').first()
+    if stored is not None:
+        instance._loaded_location_id, instance._loaded_booked = stored
+
+
+@receiver(post_save, sender=ParkingSpot)
+def move_spot_occupancy(sender, instance, created, **kwargs):
+    old_location_id = getattr(instance, '_loaded_location_id', None)
+    if not created and old_location_id not in (None, instance.location_id_id):
+        occupancy.move_spot(instance.pk, old_location_id, instance.location_id_id)
+
+
+@receiver(post_save, sender=ParkingSpot)
+def count_spot_saved(sender, instance, created, **kwargs):
+    location_id, booked = instance.location_id_id, bool(instance.lsBooked)
+    old_location_id = getattr(instance, '_loaded_location_id', None)
+    old_booked = getattr(instance, '_loaded_booked', None)
+    if not created and old_location_id is not None and old_booked is not None:
+        if (old_location_id, bool(old_booked)) == (location_id, booked):
+            return
+        counters.add(old_location_id, -1, 0 if old_booked else -1)
+    counters.add(location_id, 1, 0 if booked else 1)
+    instance._loaded_location_id, instance._loaded_booked = location_id, booked
+
+
+@receiver(post_delete, sender=ParkingSpot)
+def count_spot_deleted(sender, instance, **kwargs):
+    booked = getattr(instance, '_loaded_booked', instance.lsBooked)
+    counters.add(getattr(instance, '_loaded_location_id', None) or instance.location_id_id,
+                 -1, 0 if booked else -1)
+
+
+@receiver(post_save, sender=Location)
+def move_location_occupancy(sender, instance, created, **kwargs):
+    old_city_id = getattr(instance, '_loaded_city_id', None)
+    if not created and old_city_id not in (None, instance.city_id_id):
+        occupancy.move_location(instance.pk, instance.city_id_id)
+
+
+@receiver(post_save, sender=Location)
+def move_location_counters(sender, instance, created, **kwargs):
+    old_city_id, city_id = getattr(instance, '_loaded_city_id', None), instance.city_id_id
+    if created or old_city_id in (None, city_id):
+        return
+    stored = Location.objects.filter(pk=instance.pk).values_list('totalSpots', 'freeSpots').first()
+    if stored is not None:
+        counters.move_location(*stored, old_city_id, city_id)
+        transaction.on_commit(lambda: catalog.invalidate('cities'))
+    instance._loaded_city_id = city_id
+
+
+@receiver(post_save, sender=City)
+def index_city_name(sender, instance, **kwargs):
+    args = ('city', instance.pk, instance.cityName)
+    transaction.on_commit(lambda: name_index.update(*args))
+
+
+@receiver(post_save, sender=Location)
+def index_location_name(sender, instance, **kwargs):
+    args = ('location', instance.pk, instance.locationName, instance.city_id_id)
+    transaction.on_commit(lambda: name_index.update(*args))
+
+
+@receiver(post_delete, sender=City)
+@receiver(post_delete, sender=Location)
+def unindex_name(sender, instance, **kwargs):
+    args = ('city' if sender is City else 'location', instance.pk)
+    transaction.on_commit(lambda: name_index.remove(*args))
@@ -1,3 +1,1129 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import importlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Q
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import archive, catalog, expiry, holds, occupancy
+from .availability import AvailabilityIndex, availability_index
+from .events import availability_broker
+from .field_plans import field_plan
+from .geo import encode_geohash
+from .idempotency import idempotent
+from .models import ArchivedBooking, Booking, CarDetail, City, IdempotencyRecord, Location, ParkingSpot, SpotHold, User
+from .nearby import locations_within
+from .pagination import KeysetPagination
+from .search import NameIndex, name_index
+from .serializers import ParkingSpotSerializer, sparse_queryset
+
+logger = logging.getLogger(__name__)
+
+
+class BookingConcurrencyTests(TransactionTestCase):
+    requests = 300
+    workers = 32
+
+    def setUp(self):
+        city = City.objects.create(cityName='Pune')
+        self.location = Location.objects.create(locationName='Station Road', city_id=city)
+        self.spots = [
+            ParkingSpot.objects.create(spotNumber=f'S{number}', location_id=self.location)
+            for number in range(5)
+        ]
+        self.users = [
+            User.objects.create(username=f'user{number}', email=f'user{number}@example.com', phone_number=str(number))
+            for number in range(self.workers)
+        ]
+
+    def book(self, number):
+        # Every request targets one of a handful of spots with overlapping
+        # windows on the same day, so most of them have to lose.
+        client = APIClient()
+        start = datetime.time(9 + number % 3, 0)
+        payload = {
+            'user_id': self.users[number % self.workers].pk,
+            'spot_id': self.spots[number % len(self.spots)].pk,
+            'location_id': self.location.pk,
+            'bookingDate': '2026-03-02',
+            'startTime': start.isoformat(),
+            'endTime': start.replace(hour=start.hour + 2).isoformat(),
+        }
+        try:
+            return client.post('/bookings/', payload, format='json').status_code
+        finally:
+            connection.close()
+
+    def test_no_double_booking_under_contention(self):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            statuses = list(pool.map(self.book, range(self.requests)))
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(set(statuses) - {201, 409}, set())
+        bookings = list(Booking.objects.order_by('spot_id', 'startTime'))
+        self.assertEqual(statuses.count(201), len(bookings))
+        for previous, booking in zip(bookings, bookings[1:]):
+            if previous.spot_id_id == booking.spot_id_id:
+                self.assertLessEqual(previous.endTime, booking.startTime)
+
+        logger.debug(
+            '%d booking requests on %d spots: %d created, %d conflicts, %.0f req/s',
+            self.requests, len(self.spots), statuses.count(201), statuses.count(409), self.requests / elapsed)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Asserts on the SQLite query plan format.')
+class HotQueryIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(cityName='Pune')
+        location = Location.objects.create(locationName='Station Road', city_id=city)
+        cls.spot = ParkingSpot.objects.create(spotNumber='S1', location_id=location)
+        cls.user = User.objects.create(username='driver', email='driver@example.com', phone_number='9000000000')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotRegex(plan, r'SCAN api_(booking|parkingspot|user)\b')
+
+    def test_booking_overlap_check(self):
+        bookings = Booking.objects.filter(
+            spot_id=self.spot, bookingDate=datetime.date(2026, 3, 2),
+            startTime__lt=datetime.time(11), endTime__gt=datetime.time(9))
+        self.assertUsesIndex(bookings, 'booking_spot_date_start_idx')
+
+    def test_bookings_of_user_by_date(self):
+        bookings = Booking.objects.filter(user_id=self.user, bookingDate__gte=datetime.date(2026, 3, 2))
+        self.assertUsesIndex(bookings, 'booking_user_date_idx')
+
+    def test_free_spots_of_location(self):
+        spots = ParkingSpot.objects.filter(location_id=self.spot.location_id_id, lsBooked=False)
+        self.assertUsesIndex(spots, 'spot_location_booked_idx')
+
+    def test_login_lookup(self):
+        users = User.objects.filter(Q(email='driver@example.com') | Q(phone_number='driver@example.com'))
+        plan = users.explain()
+        self.assertRegex(plan, r'MULTI-INDEX OR')
+        self.assertEqual(plan.count('USING INDEX sqlite_autoindex_api_user'), 2)
+
+    def test_registration_uniqueness_checks(self):
+        for field in ('email', 'phone_number'):
+            users = User.objects.filter(**{field: 'driver@example.com'})
+            self.assertIn('USING INDEX sqlite_autoindex_api_user', users.explain())
+
+
+
+class BookingExpandQueryTests(TestCase):
+    EXPAND = 'spot,location,city,car'
+
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(cityName='Pune')
+        locations = [Location.objects.create(locationName=name, city_id=city) for name in ('Station Road', 'Camp')]
+        for number in range(6):
+            user = User.objects.create_user(f'expand{number}', f'expand{number}@example.com', 'pw',
+                                            phone_number=str(565 + number))
+            CarDetail.objects.create(user_id=user, number_plate=f'MH12{number}', make_and_model='Swift',
+                                     year='2020', color='red')
+            location = locations[number % 2]
+            spot = ParkingSpot.objects.create(spotNumber=f'S{number}', location_id=location)
+            # Half the bookings leave location and city to the spot.
+            Booking.objects.create(user_id=user, spot_id=spot, bookingDate=datetime.date(2024, 1, 10),
+                                   startTime='09:00', endTime='10:00',
+                                   **({'location_id': location, 'city_id': city} if number % 2 else {}))
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        client = APIClient()
+        for page_size in (2, 6):
+            with self.assertNumQueries(2):
+                response = client.get('/bookings/', {'expand': self.EXPAND, 'page_size': page_size})
+            results = response.json()['results']
+            self.assertEqual(len(results), page_size)
+            self.assertEqual(results[0]['city_id']['cityName'], 'Pune')
+            self.assertEqual(len(results[0]['car_details']), 1)
+
+    def test_fields_decides_on_car_details(self):
+        client = APIClient()
+        for fields, expected in (('spot_id', {'id', 'spot_id'}),
+                                 ('spot_id,car_details', {'id', 'spot_id', 'car_details'})):
+            response = client.get('/bookings/', {'expand': self.EXPAND, 'fields': fields})
+            self.assertEqual(set(response.json()['results'][0]), expected)
+
+    def test_detail_query_count(self):
+        booking = Booking.objects.first()
+        with self.assertNumQueries(2):
+            response = APIClient().get(f'/bookings/{booking.pk}/', {'expand': self.EXPAND})
+        self.assertEqual(response.json()['spot_id']['spotNumber'], 'S0')
+
+
+
+class NearbyLocationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(cityName='Pune')
+        for name, latitude, longitude in (('Station Road', 18.5286, 73.8744), ('Shivajinagar', 18.5308, 73.8475),
+                                          ('Marine Drive', 18.9440, 72.8230), ('Unmapped', None, None)):
+            Location.objects.create(locationName=name, city_id=city,
+                                    location_latitude=latitude, location_longitude=longitude)
+
+    def nearby(self, **params):
+        response = APIClient().get('/get-nearby-locations/', {'latitude': 18.5290, 'longitude': 73.8740, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['Locations']
+
+    def test_nearest_first(self):
+        found = self.nearby(k=2)
+        self.assertEqual([location['locationName'] for location in found], ['Station Road', 'Shivajinagar'])
+        self.assertLess(found[0]['distance_km'], found[1]['distance_km'])
+        self.assertEqual([location['locationName'] for location in self.nearby(k=10)][-1], 'Marine Drive')
+
+    def test_radius_limits_the_search(self):
+        self.assertEqual([location['locationName'] for location in self.nearby(radius_km=10)],
+                         ['Station Road', 'Shivajinagar'])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'Asserts on the SQLite query plan format.')
+    def test_range_scan_uses_geohash_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            locations_within(18.5290, 73.8740, 10)
+        sql = queries[0]['sql']
+        self.assertIn('"geohash" >=', sql)
+        self.assertNotIn('LIKE', sql)
+        with connection.cursor() as cursor:
+            plan = ' '.join(str(row) for row in cursor.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall())
+        self.assertIn('geohash', plan)
+        self.assertNotRegex(plan, r'SCAN api_location\b')
+
+    def test_migration_drops_invalid_coordinates(self):
+        to_float = importlib.import_module('api.migrations.0002_location_numeric_coordinates')._to_float
+        self.assertEqual(to_float('18.5', 90), 18.5)
+        for value in ('nan', 'inf', '-inf', '95', 'north', None):
+            self.assertIsNone(to_float(value, 90))
+        self.assertEqual(to_float('-179.9', 180), -179.9)
+        self.assertIsNone(to_float('181', 180))
+
+
+class FieldPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(cityName='Pune')
+        cls.location = Location.objects.create(locationName='Station Road', city_id=city)
+        for number in range(5):
+            ParkingSpot.objects.create(spotNumber=f'S{number}', location_id=cls.location, lsBooked=number % 2 == 0)
+
+    def test_renders_like_the_serializer(self):
+        spots = ParkingSpot.objects.order_by('id')
+        for fields in (frozenset(), frozenset({'spotNumber', 'location_id'})):
+            plan = field_plan(ParkingSpotSerializer, fields)
+            serializer = ParkingSpotSerializer(spots, many=True, context={'fields': fields})
+            self.assertEqual(
+                JSONRenderer().render(plan.serialize(plan.values_list(spots))),
+                JSONRenderer().render(serializer.data))
+
+    def test_list_pages_through_dict_rows(self):
+        client = APIClient()
+        page = client.get('/parking-spots/', {'page_size': 2}).json()
+        seen = [spot['id'] for spot in page['results']]
+        while page['next']:
+            page = client.get(page['next']).json()
+            seen += [spot['id'] for spot in page['results']]
+        self.assertEqual(seen, list(ParkingSpot.objects.order_by('id').values_list('id', flat=True)))
+
+
+
+class SparseFieldsTests(TestCase):
+    # (endpoint, a field to keep, a field that must go) for every list with ?fields=.
+    LISTS = [
+        ('/cities/', 'cityName', 'totalSpots'),
+        ('/locations/', 'locationName', 'location_latitude'),
+        ('/parking-spots/', 'spotNumber', 'lsBooked'),
+        ('/cardetail/', 'number_plate', 'make_and_model'),
+        ('/bookings/', 'bookingDate', 'startTime'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('sparse', 'sparse@example.com', 'pw', phone_number='573')
+        CarDetail.objects.create(user_id=user, number_plate='MH12', make_and_model='Swift', year='2020', color='red')
+        city = City.objects.create(cityName='Pune')
+        location = Location.objects.create(locationName='Station Road', city_id=city,
+                                           location_latitude=18.5, location_longitude=73.8)
+        spot = ParkingSpot.objects.create(spotNumber='S1', location_id=location)
+        Booking.objects.create(user_id=user, spot_id=spot, bookingDate=datetime.date(2024, 1, 10),
+                               startTime='09:00', endTime='10:00')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_each_list_returns_only_the_requested_fields(self):
+        for url, kept, dropped in self.LISTS:
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                response = APIClient().get(url, {'fields': kept})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(set(response.json()['results'][0]), {'id', kept})
+                # Only the kept column is selected, not the dropped one.
+                select = queries[-1]['sql'].split(' FROM ')[0]
+                self.assertIn(f'"{kept}"', select)
+                self.assertNotIn(f'"{dropped}"', select)
+
+    def test_unknown_fields_are_rejected(self):
+        for url, kept, _ in self.LISTS:
+            with self.subTest(url=url):
+                response = APIClient().get(url, {'fields': f'{kept},nope,password'})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['fields'], ['Unknown fields: nope, password.'])
+
+    def test_sparse_queryset_defers_other_columns(self):
+        bookings = sparse_queryset(Booking.objects.all(), {'bookingDate'})
+        self.assertEqual(bookings.query.deferred_loading, ({'id', 'bookingDate'}, False))
+        self.assertIs(sparse_queryset(Booking.objects.all(), set()).query.deferred_loading[1], True)
+
+
+class ReadReplicaRouterTests(TransactionTestCase):
+    # A second SQLite file stands in for the replica. It is registered and
+    # migrated for each test, and seeded with different rows than the
+    # default database, so the responses show where each read went.
+
+    def setUp(self):
+        handle, self.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections.settings['replica'] = {**connections.settings['default'], 'NAME': self.replica_path}
+        call_command('migrate', database='replica', verbosity=0)
+        cache.clear()
+
+        self.city = City.objects.create(cityName='Primary')
+        replica_city = City.objects.using('replica').create(cityName='Replica')
+        Location.objects.using('replica').create(locationName='Replica Lot', city_id=replica_city)
+
+    def tearDown(self):
+        connections['replica'].close()
+        del connections.settings['replica']
+        delattr(connections._connections, 'replica')
+        os.remove(self.replica_path)
+        cache.clear()
+
+    def test_catalog_reads_use_the_replica(self):
+        client = APIClient()
+        cities = client.get('/get-all-cities/').json()['Cities']
+        self.assertEqual([city['cityName'] for city in cities], ['Replica'])
+        page = client.get('/locations/').json()
+        self.assertEqual([location['locationName'] for location in page['results']], ['Replica Lot'])
+
+    def test_writes_and_other_reads_use_the_default(self):
+        client = APIClient()
+        self.assertEqual(client.post('/cities/', {'cityName': 'Written'}, format='json').status_code, 201)
+        self.assertEqual(client.get(f'/cities/{self.city.pk}/').json()['cityName'], 'Primary')
+        self.assertEqual(
+            sorted(City.objects.values_list('cityName', flat=True)), ['Primary', 'Written'])
+        self.assertEqual(list(City.objects.using('replica').values_list('cityName', flat=True)), ['Replica'])
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'wal', 'busy_timeout': 5000, 'synchronous': 'normal'})
+    def test_production_pragmas(self):
+        connections['replica'].close()
+        with connections['replica'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class SpotCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pune = City.objects.create(cityName='Pune')
+        cls.mumbai = City.objects.create(cityName='Mumbai')
+        cls.location = Location.objects.create(locationName='Station Road', city_id=cls.pune)
+        cls.other = Location.objects.create(locationName='Marine Drive', city_id=cls.mumbai)
+
+    def counts(self, obj):
+        obj.refresh_from_db()
+        return obj.totalSpots, obj.freeSpots
+
+    def test_follow_spot_writes(self):
+        spot = ParkingSpot.objects.create(spotNumber='S1', location_id=self.location)
+        ParkingSpot.objects.create(spotNumber='S2', location_id=self.location, lsBooked=True)
+        self.assertEqual(self.counts(self.location), (2, 1))
+        self.assertEqual(self.counts(self.pune), (2, 1))
+
+        spot.lsBooked = True
+        spot.save()
+        self.assertEqual(self.counts(self.location), (2, 0))
+        spot.location_id = self.other
+        spot.save()
+        self.assertEqual(self.counts(self.pune), (1, 0))
+        self.assertEqual(self.counts(self.mumbai), (1, 0))
+        spot.delete()
+        self.assertEqual(self.counts(self.mumbai), (0, 0))
+
+    def test_location_moves_with_its_counts(self):
+        ParkingSpot.objects.create(spotNumber='S1', location_id=self.location)
+        location = Location.objects.get(pk=self.location.pk)
+        location.city_id = self.mumbai
+        location.save()
+        self.assertEqual(self.counts(self.pune), (0, 0))
+        self.assertEqual(self.counts(self.mumbai), (1, 1))
+
+    def test_reconcile_fixes_drift(self):
+        ParkingSpot.objects.bulk_create([ParkingSpot(spotNumber='S1', location_id=self.location)])
+        self.assertEqual(self.counts(self.location), (0, 0))
+        call_command('reconcile_spot_counters', stdout=io.StringIO())
+        self.assertEqual(self.counts(self.location), (1, 1))
+        self.assertEqual(self.counts(self.pune), (1, 1))
+
+
+
+class BulkWriteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(cityName='Pune')
+        cls.locations = [Location.objects.create(locationName=name, city_id=city) for name in ('Station Road', 'Camp')]
+
+    def post_spots(self, count, prefix='B'):
+        spots = [{'spotNumber': f'{prefix}{number}', 'location_id': self.locations[number % 2].pk}
+                 for number in range(count)]
+        return APIClient().post('/parking-spots/bulk/', spots, format='json')
+
+    def test_invalid_item_fails_the_whole_batch(self):
+        spots = [{'spotNumber': 'B1', 'location_id': self.locations[0].pk},
+                 {'spotNumber': 'B2', 'location_id': 999999},
+                 {'location_id': self.locations[1].pk}]
+        response = APIClient().post('/parking-spots/bulk/', spots, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertIn('location_id', errors[1])
+        self.assertIn('spotNumber', errors[2])
+        self.assertFalse(ParkingSpot.objects.exists())
+
+    def test_patch_recomputes_geohash(self):
+        location = self.locations[0]
+        response = APIClient().patch('/locations/bulk/', [
+            {'id': location.pk, 'location_latitude': 18.5286, 'location_longitude': 73.8744},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        location.refresh_from_db()
+        self.assertEqual(location.geohash, encode_geohash(18.5286, 73.8744))
+        self.assertEqual(response.json()[0]['geohash'], location.geohash)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        counts = []
+        for count, prefix in ((4, 'B'), (40, 'C')):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post_spots(count, prefix).status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(ParkingSpot.objects.count(), 44)
+
+
+
+class CatalogCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pune = City.objects.create(cityName='Pune')
+        cls.mumbai = City.objects.create(cityName='Mumbai')
+        cls.location = Location.objects.create(locationName='Station Road', city_id=cls.pune)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def city_names(self):
+        return [city['cityName'] for city in self.client.get('/get-all-cities/').json()['Cities']]
+
+    def location_names(self, city=None):
+        if city is None:
+            return [location['locationName'] for location in self.client.get('/locations/').json()['results']]
+        response = self.client.post('/get-locations-by-city/', {'city_id': city.pk}, format='json')
+        return [location['locationName'] for location in response.json()['Locations']]
+
+    def test_city_writes_invalidate_cities(self):
+        self.assertEqual(self.city_names(), ['Pune', 'Mumbai'])
+        with self.captureOnCommitCallbacks(execute=True):
+            City.objects.filter(pk=self.mumbai.pk).get().delete()
+        self.assertEqual(self.city_names(), ['Pune'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pune.cityName = 'Poona'
+            self.pune.save()
+        self.assertEqual(self.city_names(), ['Poona'])
+
+    def test_location_writes_invalidate_locations(self):
+        self.assertEqual(self.location_names(), ['Station Road'])
+        self.assertEqual(self.location_names(self.pune), ['Station Road'])
+        self.assertEqual(self.location_names(self.mumbai), [])
+        location = Location.objects.get(pk=self.location.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            location.locationName = 'Marine Drive'
+            location.city_id = self.mumbai
+            location.save()
+        self.assertEqual(self.location_names(), ['Marine Drive'])
+        self.assertEqual(self.location_names(self.pune), [])
+        self.assertEqual(self.location_names(self.mumbai), ['Marine Drive'])
+        with self.captureOnCommitCallbacks(execute=True):
+            location.delete()
+        self.assertEqual(self.location_names(), [])
+        self.assertEqual(self.location_names(self.mumbai), [])
+
+    def test_unrelated_write_keeps_the_cache(self):
+        self.city_names()
+        self.location_names()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user('catalog', 'catalog@example.com', 'pw', phone_number='571')
+        hits = catalog.stats()['hits']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.city_names(), ['Pune', 'Mumbai'])
+            self.assertEqual(self.location_names(), ['Station Road'])
+        self.assertEqual(catalog.stats()['hits'], hits + 2)
+
+
+
+class CachedJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('jwt', 'jwt@example.com', 'pw', phone_number='572')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def release(self):
+        return self.client.delete('/spot-holds/1/')
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.release().status_code, 204)
+        return [query['sql'] for query in queries if '"api_user"' in query['sql']]
+
+    def test_second_request_does_not_load_the_user(self):
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+
+    def test_deactivated_user_is_rejected(self):
+        self.release()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.release().status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.release()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.release().status_code, 401)
+
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(cityName='Pune')
+        location = Location.objects.create(locationName='Station Road', city_id=city)
+        cls.ids = [ParkingSpot.objects.create(spotNumber=f'S{number}', location_id=location).pk
+                   for number in range(10)]
+
+    def walk(self, url, params, link):
+        client, pages = APIClient(), []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                page = client.get(url, params).json()
+            self.assertNotIn('OFFSET', queries[-1]['sql'])
+            pages.append([spot['id'] for spot in page['results']])
+            url, params = page[link], None
+        return pages, page
+
+    def test_walks_every_page_both_ways(self):
+        forward, last = self.walk('/parking-spots/', {'page_size': 3}, 'next')
+        self.assertEqual(forward, [self.ids[0:3], self.ids[3:6], self.ids[6:9], self.ids[9:]])
+        backward, _ = self.walk(last['previous'], None, 'previous')
+        self.assertEqual(backward, [self.ids[6:9], self.ids[3:6], self.ids[0:3]])
+
+    def test_page_size_is_clamped(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 4):
+            pages, _ = self.walk('/parking-spots/', {'page_size': 50}, 'next')
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+        self.assertEqual(sum(pages, []), self.ids)
+
+
+class AutocompleteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.city = City.objects.create(cityName='São Paulo')
+        Location.objects.create(locationName='Paulista Avenue', city_id=cls.city)
+        Location.objects.create(locationName='Estação da Luz', city_id=cls.city)
+
+    def setUp(self):
+        name_index.clear()
+
+    def names(self, **params):
+        return [match['name'] for match in APIClient().get('/autocomplete/', params).json()['Matches']]
+
+    def test_prefix_ignores_case_accents_and_one_typo(self):
+        self.assertEqual(self.names(q='SAO'), ['São Paulo'])
+        self.assertEqual(self.names(q='paul'), ['Paulista Avenue', 'São Paulo'])
+        self.assertEqual(self.names(q='estacao'), ['Estação da Luz'])
+        self.assertEqual(self.names(q='pualista', type='location'), ['Paulista Avenue'])
+
+    def test_follows_writes(self):
+        self.names(q='x')
+        location = Location.objects.get(locationName='Paulista Avenue')
+        with self.captureOnCommitCallbacks(execute=True):
+            location.locationName = 'Avenida Paulista'
+            location.save()
+        self.assertEqual(self.names(q='aven'), ['Avenida Paulista'])
+        with self.captureOnCommitCallbacks(execute=True):
+            location.delete()
+        self.assertEqual(self.names(q='aven'), [])
+
+    def test_build_does_not_block_writes(self):
+        index = NameIndex()
+        load = index._load
+
+        def load_with_concurrent_rename():
+            result = load()
+            # Runs while the build is under way, from another thread.
+            writer = threading.Thread(target=index.update, args=('city', self.city.pk, 'Sao Paulo Capital'))
+            writer.start()
+            writer.join(timeout=5)
+            self.assertFalse(writer.is_alive())
+            return result
+
+        index._load = load_with_concurrent_rename
+        index.warm()
+        self.assertEqual([match['name'] for match in index.search('sao')], ['Sao Paulo Capital'])
+
+
+class BookingArchiveExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('archive', 'archive@example.com', 'pw', phone_number='555')
+        city = City.objects.create(cityName='Pune')
+        location = Location.objects.create(locationName='Station Road', city_id=city)
+        spot = ParkingSpot.objects.create(spotNumber='S1', location_id=location)
+        today = datetime.date.today()
+        cls.dates = [today - datetime.timedelta(days=400), today - datetime.timedelta(days=300), today]
+        for date in cls.dates:
+            Booking.objects.create(user_id=user, spot_id=spot, location_id=location, city_id=city,
+                                   bookingDate=date, startTime='09:00', endTime='10:00')
+        call_command('archive_bookings', stdout=io.StringIO())
+
+    def exported_dates(self, **params):
+        response = APIClient().get('/bookings/export/', params)
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        return [json.loads(row)['bookingDate'] for row in rows]
+
+    def test_export_reads_the_archive(self):
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(self.exported_dates(date_to=self.dates[1]), [str(date) for date in self.dates[:2]])
+        self.assertEqual(self.exported_dates(), [str(date) for date in self.dates])
+        self.assertEqual(self.exported_dates(date_from=self.dates[2]), [str(self.dates[2])])
+
+
+
+class BookingArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('archived', 'archived@example.com', 'pw', phone_number='564')
+        city = City.objects.create(cityName='Pune')
+        cls.location = Location.objects.create(locationName='Station Road', city_id=city)
+        spot = ParkingSpot.objects.create(spotNumber='S1', location_id=cls.location)
+        first_kept = archive.horizon()
+        cls.past = first_kept - datetime.timedelta(days=1)
+        # Old and recent bookings interleaved by id.
+        dates = [cls.past, first_kept, cls.past - datetime.timedelta(days=100), timezone.localdate(), cls.past]
+        cls.bookings = [
+            Booking.objects.create(user_id=user, spot_id=spot, bookingDate=date,
+                                   startTime='09:00', endTime='10:00')
+            for date in dates
+        ]
+        cls.archived_ids = [booking.pk for booking in cls.bookings if booking.bookingDate < first_kept]
+        cls.kept_ids = [booking.pk for booking in cls.bookings if booking.bookingDate >= first_kept]
+
+    def archive(self):
+        with mock.patch.object(availability_broker, 'publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_bookings', '--batch-size', '2', stdout=io.StringIO())
+        return publish
+
+    def test_moves_only_rows_before_the_horizon(self):
+        minutes = occupancy.occupancy(location_id=self.location.pk, granularity='day')
+        publish = self.archive()
+        self.assertEqual(sorted(ArchivedBooking.objects.values_list('pk', flat=True)), self.archived_ids)
+        self.assertEqual(sorted(Booking.objects.values_list('pk', flat=True)), self.kept_ids)
+        self.assertEqual(occupancy.occupancy(location_id=self.location.pk, granularity='day'), minutes)
+        publish.assert_not_called()
+
+    def test_list_pages_across_both_tables(self):
+        self.archive()
+        client, url, ids = APIClient(), '/bookings/', []
+        params = {'date_from': self.past - datetime.timedelta(days=100), 'page_size': 2}
+        while url:
+            page = client.get(url, params).json()
+            ids += [booking['id'] for booking in page['results']]
+            url, params = page['next'], None
+        self.assertEqual(ids, [booking.pk for booking in self.bookings])
+        previous = client.get(page['previous']).json()
+        self.assertEqual([booking['id'] for booking in previous['results']], ids[2:4])
+
+    def test_detail_returns_archived_booking(self):
+        self.archive()
+        response = APIClient().get(f'/bookings/{self.archived_ids[0]}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['bookingDate'], str(self.past))
+
+
+class OccupancyMoveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('rollup', 'rollup@example.com', 'pw', phone_number='556')
+        cls.city_a = City.objects.create(cityName='Pune')
+        cls.city_b = City.objects.create(cityName='Mumbai')
+        cls.location = Location.objects.create(locationName='Station Road', city_id=cls.city_a)
+        cls.other = Location.objects.create(locationName='Marine Drive', city_id=cls.city_b)
+        cls.spot = ParkingSpot.objects.create(spotNumber='S1', location_id=cls.location)
+        cls.date = datetime.date(2024, 1, 10)
+        Booking.objects.create(user_id=cls.user, spot_id=cls.spot, bookingDate=cls.date,
+                               startTime='09:00', endTime='10:00')
+
+    def minutes(self, **place):
+        return sum(row['bookedMinutes'] for row in occupancy.occupancy(**place, granularity='day'))
+
+    def test_location_moving_city_takes_its_minutes(self):
+        location = Location.objects.get(pk=self.location.pk)
+        location.city_id = self.city_b
+        location.save()
+        self.assertEqual(self.minutes(city_id=self.city_a.pk), 0)
+        self.assertEqual(self.minutes(city_id=self.city_b.pk), 60)
+
+    def test_spot_moving_location_takes_its_minutes(self):
+        spot = ParkingSpot.objects.get(pk=self.spot.pk)
+        spot.location_id = self.other
+        spot.save()
+        self.assertEqual(self.minutes(location_id=self.location.pk), 0)
+        self.assertEqual(self.minutes(location_id=self.other.pk), 60)
+        booking = Booking.objects.get(spot_id=self.spot)
+        booking.endTime = datetime.time(11)
+        booking.save()
+        self.assertEqual(self.minutes(location_id=self.other.pk), 120)
+        booking.delete()
+        self.assertEqual(self.minutes(location_id=self.other.pk), 0)
+        self.assertEqual(self.minutes(city_id=self.city_a.pk), 0)
+
+
+@api_view(['POST'])
+@idempotent
+def _counting_view(request):
+    _counting_view.calls += 1
+    if request.data.get('fail'):
+        return Response({'error': 'boom'}, status=500)
+    return Response({'call': _counting_view.calls}, status=201)
+
+
+class IdempotencyTests(TestCase):
+
+    def setUp(self):
+        _counting_view.calls = 0
+        self.user = User.objects.create_user('keyed', 'keyed@example.com', 'pw', phone_number='557')
+
+    def post(self, data, key='key-1', user=True):
+        request = APIRequestFactory().post('/keyed/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        if user:
+            force_authenticate(request, user=self.user)
+        return _counting_view(request)
+
+    def test_replays_the_stored_response(self):
+        first, second = self.post({'a': 1}), self.post({'a': 1})
+        self.assertEqual((second.status_code, second.data), (201, {'call': 1}))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(_counting_view.calls, 1)
+        self.assertGreater(IdempotencyRecord.objects.get().expiresAt,
+                           timezone.now() + datetime.timedelta(hours=1))
+
+    def test_rejects_a_different_request_with_the_same_key(self):
+        self.post({'a': 1})
+        self.assertEqual(self.post({'a': 2}).status_code, 422)
+
+    def test_concurrent_duplicate_gets_409_until_the_lease_ends(self):
+        self.post({'a': 1})
+        # As if the first request were still running.
+        pending = IdempotencyRecord.objects.all()
+        pending.update(statusCode=None, expiresAt=timezone.now() + datetime.timedelta(seconds=30))
+        self.assertEqual(self.post({'a': 1}).status_code, 409)
+        pending.update(expiresAt=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(self.post({'a': 1}).status_code, 201)
+        self.assertEqual(_counting_view.calls, 2)
+
+    def test_server_error_releases_the_key(self):
+        self.assertEqual(self.post({'fail': True}).status_code, 500)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+        self.assertEqual(self.post({'fail': True}).status_code, 500)
+        self.assertEqual(_counting_view.calls, 2)
+
+    def test_keyed_requests_need_a_user(self):
+        self.assertEqual(self.post({'a': 1}, user=False).status_code, 401)
+        self.assertEqual(_counting_view.calls, 0)
+
+
+
+class AvailabilityIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('index', 'index@example.com', 'pw', phone_number='558')
+        city = City.objects.create(cityName='Pune')
+        cls.location = Location.objects.create(locationName='Station Road', city_id=city)
+        cls.spot = ParkingSpot.objects.create(spotNumber='S1', location_id=cls.location)
+        cls.date = datetime.date(2024, 1, 10)
+
+    def setUp(self):
+        availability_index.clear()
+
+    def book(self, start, end):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Booking.objects.create(user_id=self.user, spot_id=self.spot, bookingDate=self.date,
+                                          startTime=datetime.time(start), endTime=datetime.time(end))
+
+    def busy(self, start, end, index=availability_index):
+        return bool(index.busy_spot_ids(self.location.pk, self.date, datetime.time(*start), datetime.time(*end)))
+
+    def test_overlap_boundaries(self):
+        self.book(9, 10)
+        self.assertFalse(self.busy((8,), (9,)))
+        self.assertFalse(self.busy((10,), (11,)))
+        self.assertTrue(self.busy((8,), (9, 1)))
+        self.assertTrue(self.busy((9, 59), (11,)))
+        self.assertTrue(self.busy((9, 15), (9, 45)))
+
+    def test_reloads_after_the_ttl(self):
+        index = AvailabilityIndex(ttl=60)
+        self.assertFalse(self.busy((9,), (10,), index))
+        # Written without signals, as another process would.
+        Booking.objects.bulk_create([Booking(user_id=self.user, spot_id=self.spot, bookingDate=self.date,
+                                             startTime=datetime.time(9), endTime=datetime.time(10))])
+        self.assertFalse(self.busy((9,), (10,), index))
+        index.ttl = 0
+        self.assertTrue(self.busy((9,), (10,), index))
+
+    def test_follows_booking_updates_and_deletes(self):
+        booking = self.book(9, 10)
+        self.assertTrue(self.busy((9,), (10,)))
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.startTime, booking.endTime = datetime.time(14), datetime.time(15)
+            booking.save()
+        self.assertFalse(self.busy((9,), (10,)))
+        self.assertTrue(self.busy((14,), (15,)))
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        self.assertFalse(self.busy((14,), (15,)))
+
+    def test_bookings_committed_during_a_load_are_kept(self):
+        def commit_booking_meanwhile(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            # Another thread's on-commit update, while this one reads the day.
+            writer = threading.Thread(target=availability_index.add_booking, args=(
+                999, self.location.pk, self.spot.pk, self.date, datetime.time(9), datetime.time(10)))
+            writer.start()
+            writer.join(timeout=5)
+            self.assertFalse(writer.is_alive())
+            return result
+
+        with connection.execute_wrapper(commit_booking_meanwhile):
+            self.assertTrue(self.busy((9,), (10,)))
+        self.assertTrue(self.busy((9,), (10,)))
+
+
+class SpotHoldTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', 'alice@example.com', 'pw', phone_number='559')
+        cls.bob = User.objects.create_user('bob', 'bob@example.com', 'pw', phone_number='560')
+        city = City.objects.create(cityName='Pune')
+        cls.location = Location.objects.create(locationName='Station Road', city_id=city)
+        cls.spot = ParkingSpot.objects.create(spotNumber='S1', location_id=cls.location)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def hold(self, user):
+        return self.client_for(user).post('/spot-holds/', {'spot_id': self.spot.pk}, format='json')
+
+    def booking(self, user):
+        return {'user_id': user.pk, 'spot_id': self.spot.pk, 'bookingDate': '2024-01-10',
+                'startTime': '09:00', 'endTime': '10:00'}
+
+    def test_acquire_extend_and_conflict(self):
+        first = self.hold(self.alice)
+        self.assertEqual(first.status_code, 201)
+        SpotHold.objects.update(expiresAt=timezone.now() + datetime.timedelta(seconds=5))
+        self.assertEqual(self.hold(self.alice).status_code, 201)
+        self.assertGreater(SpotHold.objects.get().expiresAt, timezone.now() + datetime.timedelta(seconds=60))
+        self.assertEqual(self.hold(self.bob).status_code, 409)
+        self.assertEqual(APIClient().post('/bookings/', self.booking(self.bob), format='json').status_code, 409)
+
+    def test_expired_hold_can_be_taken(self):
+        self.hold(self.alice)
+        SpotHold.objects.update(expiresAt=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(self.hold(self.bob).status_code, 201)
+        self.assertEqual(holds.holder(self.spot.pk), self.bob.pk)
+
+    def test_confirm_books_and_releases(self):
+        self.hold(self.alice)
+        data = {'bookingDate': '2024-01-10', 'startTime': '09:00', 'endTime': '10:00'}
+        self.assertEqual(self.client_for(self.bob).post(
+            f'/spot-holds/{self.spot.pk}/confirm/', data, format='json').status_code, 409)
+        response = self.client_for(self.alice).post(f'/spot-holds/{self.spot.pk}/confirm/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(holds.holder(self.spot.pk))
+        self.assertTrue(Booking.objects.filter(user_id=self.alice, spot_id=self.spot).exists())
+
+    def test_async_availability_hides_only_other_users_holds(self):
+        self.hold(self.alice)
+        for user, visible in ((self.alice, [self.spot.pk]), (self.bob, [])):
+            token = RefreshToken.for_user(user).access_token
+            response = async_to_sync(AsyncClient().post)(
+                '/async/get-spot-numbers-by-location/', {'location_id': self.location.pk},
+                content_type='application/json', headers={'Authorization': f'Bearer {token}'})
+            self.assertEqual([spot['id'] for spot in json.loads(response.content)['SpotNumbers']], visible)
+
+
+class AvailabilityStreamTests(TestCase):
+
+    def test_refused_outside_asgi(self):
+        city = City.objects.create(cityName='Pune')
+        location = Location.objects.create(locationName='Station Road', city_id=city)
+        response = APIClient().get(f'/locations/{location.pk}/availability/stream/')
+        self.assertEqual(response.status_code, 501)
+
+
+
+class AvailabilityBrokerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('broker', 'broker@example.com', 'pw', phone_number='574')
+        city = City.objects.create(cityName='Pune')
+        cls.location = Location.objects.create(locationName='Station Road', city_id=city)
+        cls.other = Location.objects.create(locationName='Camp', city_id=city)
+        cls.spot = ParkingSpot.objects.create(spotNumber='S1', location_id=cls.location)
+
+    def events_after(self, write):
+        """(events for self.location, events for self.other) published by ``write`` once it commits."""
+        def write_and_commit():
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+                # Nothing goes out before the commit.
+                self.assertTrue(queue.empty())
+
+        async def listen():
+            nonlocal queue
+            queue = availability_broker.subscribe(self.location.pk)
+            other_queue = availability_broker.subscribe(self.other.pk)
+            try:
+                await sync_to_async(write_and_commit)()
+                await asyncio.sleep(0)
+                return [drain(queue), drain(other_queue)]
+            finally:
+                availability_broker.unsubscribe(self.location.pk, queue)
+                availability_broker.unsubscribe(self.other.pk, other_queue)
+
+        def drain(events):
+            return [events.get_nowait() for _ in range(events.qsize())]
+
+        queue = None
+        return async_to_sync(listen)()
+
+    def test_booking_commit_reaches_its_location_only(self):
+        events, others = self.events_after(lambda: Booking.objects.create(
+            user_id=self.user, spot_id=self.spot, bookingDate=datetime.date(2024, 1, 10),
+            startTime='09:00', endTime='10:00'))
+        self.assertEqual([(event['type'], event['booking']['spot_id']) for event in events],
+                         [('booking', self.spot.pk)])
+        self.assertEqual(others, [])
+
+    def test_spot_commit_reaches_its_location_only(self):
+        def book_spot():
+            self.spot.lsBooked = True
+            self.spot.save()
+
+        events, others = self.events_after(book_spot)
+        self.assertEqual([(event['type'], event['spot']['lsBooked']) for event in events], [('spot', True)])
+        self.assertEqual(others, [])
+
+
+@override_settings(REQUEST_PROFILING=True, MIDDLEWARE=settings.MIDDLEWARE)
+class RequestProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('profiled', 'profiled@example.com', 'pw', phone_number='561')
+        city = City.objects.create(cityName='Pune')
+        location = Location.objects.create(locationName='Station Road', city_id=city)
+        spot = ParkingSpot.objects.create(spotNumber='S1', location_id=location)
+        for hour in (9, 11):
+            Booking.objects.create(user_id=user, spot_id=spot, bookingDate=datetime.date(2024, 1, 10),
+                                   startTime=datetime.time(hour), endTime=datetime.time(hour + 1))
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries, self.assertLogs('api.profiling', 'INFO') as logs:
+            response = APIClient().get('/bookings/')
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        for metric in ('serialize;dur=', 'view;dur=', 'total;dur='):
+            self.assertIn(metric, timing)
+        self.assertGreater(float(timing.split('serialize;dur=')[1].split(',')[0]), 0)
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record['path'], record['queries']), ('/bookings/', len(queries)))
+        self.assertNotIn('repeated_queries', record)
+
+    def test_logs_repeated_queries_past_the_threshold(self):
+        with self.settings(REQUEST_PROFILING_REPEAT_THRESHOLD=0), \
+                self.assertLogs('api.profiling', 'WARNING') as logs:
+            APIClient().get('/bookings/')
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertTrue(any('FROM "api_booking"' in item['sql'] for item in record['repeated_queries']))
+
+    @override_settings(REQUEST_PROFILING=False)
+    def test_off_by_default(self):
+        self.assertNotIn('Server-Timing', APIClient().get('/bookings/'))
+
+
+class BatchBookingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('batch', 'batch@example.com', 'pw', phone_number='562')
+        city = City.objects.create(cityName='Pune')
+        cls.location = Location.objects.create(locationName='Station Road', city_id=city)
+        cls.spots = [ParkingSpot.objects.create(spotNumber=f'S{n}', location_id=cls.location) for n in range(2)]
+        cls.dates = [datetime.date(2024, 1, 10), datetime.date(2024, 1, 11)]
+
+    def setUp(self):
+        availability_index.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, **extra):
+        data = {'spot_ids': [spot.pk for spot in self.spots], 'startTime': '09:00', 'endTime': '10:00',
+                'dates': [str(date) for date in self.dates], **extra}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/create_booking/batch/', data, format='json')
+
+    def book_first_spot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Booking.objects.create(user_id=self.user, spot_id=self.spots[0], bookingDate=self.dates[1],
+                                          startTime=datetime.time(9, 30), endTime=datetime.time(10, 30))
+
+    def minutes(self):
+        return sum(row['bookedMinutes'] for row in occupancy.occupancy(location_id=self.location.pk,
+                                                                          granularity='day'))
+
+    def busy(self, date):
+        return availability_index.busy_spot_ids(self.location.pk, date, datetime.time(9), datetime.time(10))
+
+    def test_books_every_occurrence(self):
+        response = self.batch()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['conflicts']), (4, 0))
+        self.assertEqual(Booking.objects.count(), 4)
+        self.assertEqual(self.minutes(), 4 * 60)
+        self.assertEqual(self.busy(self.dates[0]), {spot.pk for spot in self.spots})
+
+    def test_atomic_conflict_writes_nothing(self):
+        existing = self.book_first_spot()
+        self.assertEqual(self.busy(self.dates[0]), set())
+        response = self.batch()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['conflicts'], [
+            {'spot_id': self.spots[0].pk, 'bookingDate': self.dates[1], 'conflicts': [existing.pk]}])
+        self.assertEqual(list(Booking.objects.values_list('pk', flat=True)), [existing.pk])
+        self.assertEqual(self.minutes(), 60)
+        self.assertEqual(self.busy(self.dates[0]), set())
+
+    def test_non_atomic_books_the_free_occurrences(self):
+        self.book_first_spot()
+        response = self.batch(atomic=False)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['conflicts']), (3, 1))
+        statuses = {(item['spot_id'], item['bookingDate']): item['status'] for item in response.data['results']}
+        self.assertEqual(statuses[(self.spots[0].pk, self.dates[1])], 'conflict')
+        self.assertEqual(Booking.objects.count(), 4)
+        self.assertEqual(self.minutes(), 60 + 3 * 60)
+
+    def test_recurrence_expands_to_weekdays(self):
+        recurrence = {'start_date': '2024-01-01', 'end_date': '2024-01-14', 'weekdays': [0, 2]}
+        response = self.batch(spot_ids=[self.spots[0].pk], dates=['2024-01-20'], recurrence=recurrence)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(str(date) for date in Booking.objects.values_list('bookingDate', flat=True)),
+            ['2024-01-01', '2024-01-03', '2024-01-08', '2024-01-10', '2024-01-20'])
+
+
+class ExpirySweeperTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sweep', 'sweep@example.com', 'pw', phone_number='563')
+        city = City.objects.create(cityName='Pune')
+        cls.location = Location.objects.create(locationName='Station Road', city_id=city)
+        cls.now = timezone.make_aware(datetime.datetime(2024, 1, 10, 12, 0))
+
+    def spot(self, *bookings):
+        spot = ParkingSpot.objects.create(spotNumber='S', location_id=self.location, lsBooked=True)
+        for date, start, end in bookings:
+            Booking.objects.create(user_id=self.user, spot_id=spot, bookingDate=date,
+                                   startTime=datetime.time(start), endTime=datetime.time(end))
+        return spot
+
+    def test_releases_only_spots_whose_bookings_have_ended(self):
+        today, yesterday = self.now.date(), self.now.date() - datetime.timedelta(days=1)
+        ended = self.spot((yesterday, 9, 10), (today, 8, 12))
+        in_progress = self.spot((yesterday, 9, 10), (today, 11, 13))
+        upcoming = self.spot((today, 14, 15))
+        self.assertEqual(expiry.release_expired_spots(now=self.now, batch_size=1), 1)
+        booked = dict(ParkingSpot.objects.values_list('pk', 'lsBooked'))
+        self.assertEqual(booked, {ended.pk: False, in_progress.pk: True, upcoming.pk: True})
+        self.location.refresh_from_db()
+        self.assertEqual((self.location.totalSpots, self.location.freeSpots), (3, 1))
+
+    def test_command_reports_the_count(self):
+        self.spot((datetime.date(2024, 1, 1), 9, 10))
+        self.spot((datetime.date(2024, 1, 2), 9, 10))
+        out = io.StringIO()
+        call_command('sweep_expired_bookings', '--once', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Released 2 spots.')
+        self.assertFalse(ParkingSpot.objects.filter(lsBooked=True).exists())
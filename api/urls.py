@@ -1,12 +1,15 @@
 from django.urls import path
+from . import async_views
 from .views import (
     CityListAPIView, CityDetailAPIView,
-    LocationListAPIView, LocationDetailAPIView,
-    ParkingSpotListAPIView, ParkingSpotDetailAPIView,
-    BookingListAPIView, BookingDetailAPIView,
+    LocationListAPIView, LocationDetailAPIView, LocationBulkAPIView,
+    ParkingSpotListAPIView, ParkingSpotDetailAPIView, ParkingSpotBulkAPIView,
+    BookingListAPIView, BookingDetailAPIView, BookingExportAPIView,
     CarDetailDetailAPIView,CarDetailListAPIView,
     RegistrationAPIView,LoginAPIView,
-    get_all_cities,get_locations_by_city,get_spot_numbers_by_location ,create_booking
+    get_all_cities,get_locations_by_city,get_spot_numbers_by_location ,create_booking, create_booking_batch,
+    get_nearby_locations, get_catalog_cache_stats, get_occupancy, autocomplete,
+    hold_spot, release_spot_hold, confirm_spot_hold,
 
 )
 
@@ -16,12 +19,15 @@ urlpatterns = [
 
     path('locations/', LocationListAPIView.as_view(), name='location-list'),
     path('locations/<int:pk>/', LocationDetailAPIView.as_view(), name='location-detail'),
+    path('locations/bulk/', LocationBulkAPIView.as_view(), name='location-bulk'),
 
     path('parking-spots/', ParkingSpotListAPIView.as_view(), name='parking-spot-list'),
     path('parking-spots/<int:pk>/', ParkingSpotDetailAPIView.as_view(), name='parking-spot-detail'),
+    path('parking-spots/bulk/', ParkingSpotBulkAPIView.as_view(), name='parking-spot-bulk'),
     
     path('bookings/', BookingListAPIView.as_view(), name='booking-list'),
     path('bookings/<int:pk>/', BookingDetailAPIView.as_view(), name='booking-detail'),
+    path('bookings/export/', BookingExportAPIView.as_view(), name='booking-export'),
     
     path('cardetail/', CarDetailListAPIView.as_view(), name='car-list'),
     path('cardetail/<int:pk>/', CarDetailDetailAPIView.as_view(), name='car-detail'),
@@ -31,6 +37,23 @@ urlpatterns = [
     path('get-all-cities/', get_all_cities, name='get_all_cities'),
     path('get-locations-by-city/', get_locations_by_city, name='get_locations_by_city'),
     path('create_booking/', create_booking, name='create_booking'),
+    path('create_booking/batch/', create_booking_batch, name='create_booking_batch'),
+    path('spot-holds/', hold_spot, name='hold_spot'),
+    path('spot-holds/<int:spot_id>/', release_spot_hold, name='release_spot_hold'),
+    path('spot-holds/<int:spot_id>/confirm/', confirm_spot_hold, name='confirm_spot_hold'),
     path('get-spot-numbers-by-location/', get_spot_numbers_by_location, name='get_spot_numbers_by_location'),
+    path('get-nearby-locations/', get_nearby_locations, name='get_nearby_locations'),
+    path('autocomplete/', autocomplete, name='autocomplete'),
+    path('catalog-cache-stats/', get_catalog_cache_stats, name='catalog_cache_stats'),
+    path('occupancy/', get_occupancy, name='occupancy'),
+
+    # Async variants of the read endpoints, served side by side under ASGI.
+    path('async/get-all-cities/', async_views.get_all_cities, name='async_get_all_cities'),
+    path('async/get-locations-by-city/', async_views.get_locations_by_city, name='async_get_locations_by_city'),
+    path('async/get-spot-numbers-by-location/', async_views.get_spot_numbers_by_location,
+         name='async_get_spot_numbers_by_location'),
+    path('async/bookings/<int:pk>/', async_views.get_booking, name='async_booking_detail'),
+    path('locations/<int:location_id>/availability/stream/', async_views.spot_availability_stream,
+         name='spot_availability_stream'),
 
 ]
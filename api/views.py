@@ -3,35 +3,76 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.exceptions import NotFound
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import City, Location, ParkingSpot, Booking, CarDetail
+from . import archive, catalog, holds, occupancy
+from .authentication import CachedJWTAuthentication
+from .availability import availability_index
+from .booking import BookingConflict, save_booking, save_booking_batch
+from .export import CONTENT_TYPES, export_bookings, filter_bookings
+from .field_plans import field_plan
+from .db import read_replica
+from .idempotency import idempotent
+from .nearby import nearest_locations
+from .pagination import KeysetPagination
+from .search import name_index
+from .models import City, Location, ParkingSpot, Booking, CarDetail, ArchivedBooking
 from .serializers import (
+    AutocompleteQuerySerializer,
+    AvailabilityQuerySerializer,
+    BatchBookingSerializer,
+    BookingExpandQuerySerializer,
+    BookingExportQuerySerializer,
+    BookingListQuerySerializer,
     CitySerializer,
     LocationSerializer,
+    LocationBulkSerializer,
+    NearbyLocationQuerySerializer,
+    OccupancyQuerySerializer,
     ParkingSpotSerializer,
+    ParkingSpotBulkSerializer,
     BookingSerializer,
+    OwnBookingSerializer,
     RegistrationSerializer,
     LoginSerializer,
+    SpotHoldSerializer,
     UserSerializer,
     CarDetailSerializer,
+    BOOKING_RELATIONS,
+    expand_bookings,
+    sparse_fields,
+    sparse_queryset,
 )
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.decorators import api_view ,permission_classes ,authentication_classes
+from django.http import StreamingHttpResponse
+
+FIELDS_PARAMETER = openapi.Parameter(
+    'fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+    description="Comma-separated fields to return; 'id' is always included.")
 
 class CityListAPIView(APIView):
     # permission_classes = [IsAuthenticated]
     # authentication_classes = [JWTAuthentication]
+    pagination_class = KeysetPagination
 
     @swagger_auto_schema(
+        manual_parameters=[FIELDS_PARAMETER],
         responses={200: CitySerializer(many=True)},
         operation_description="Retrieve the list of cities."
     )
+    @read_replica
     def get(self, request, format=None):
-        cities = City.objects.all()
-        serializer = CitySerializer(cities, many=True)
-        return Response(serializer.data)
+        fields = sparse_fields(request.query_params, CitySerializer)
+
+        def build():
+            paginator = self.pagination_class()
+            cities = paginator.paginate_queryset(sparse_queryset(City.objects.all(), fields), request, view=self)
+            serializer = CitySerializer(cities, many=True, context={'fields': fields})
+            return paginator.get_paginated_response(serializer.data).data
+
+        return Response(catalog.cached_payload(['cities'], request.build_absolute_uri(), build))
 
     @swagger_auto_schema(
         request_body=CitySerializer,
@@ -96,15 +137,24 @@ class CityDetailAPIView(APIView):
 class LocationListAPIView(APIView):
     # permission_classes = [IsAuthenticated]
     # authentication_classes = [JWTAuthentication]
+    pagination_class = KeysetPagination
 
     @swagger_auto_schema(
+        manual_parameters=[FIELDS_PARAMETER],
         responses={200: LocationSerializer(many=True)},
         operation_description="Retrieve the list of locations."
     )
+    @read_replica
     def get(self, request, format=None):
-        locations = Location.objects.all()
-        serializer = LocationSerializer(locations, many=True)
-        return Response(serializer.data)
+        fields = sparse_fields(request.query_params, LocationSerializer)
+
+        def build():
+            paginator = self.pagination_class()
+            locations = paginator.paginate_queryset(sparse_queryset(Location.objects.all(), fields), request, view=self)
+            serializer = LocationSerializer(locations, many=True, context={'fields': fields})
+            return paginator.get_paginated_response(serializer.data).data
+
+        return Response(catalog.cached_payload(['locations'], request.build_absolute_uri(), build))
 
     @swagger_auto_schema(
         request_body=LocationSerializer,
@@ -167,15 +217,20 @@ class LocationDetailAPIView(APIView):
 class ParkingSpotListAPIView(APIView):
     # permission_classes = [IsAuthenticated]
     # authentication_classes = [JWTAuthentication]
+    pagination_class = KeysetPagination
 
     @swagger_auto_schema(
+        manual_parameters=[FIELDS_PARAMETER],
         responses={200: ParkingSpotSerializer(many=True)},
         operation_description="Retrieve the list of parking spots."
     )
+    @read_replica
     def get(self, request, format=None):
-        parking_spots = ParkingSpot.objects.all()
-        serializer = ParkingSpotSerializer(parking_spots, many=True)
-        return Response(serializer.data)
+        fields = sparse_fields(request.query_params, ParkingSpotSerializer)
+        plan = field_plan(ParkingSpotSerializer, frozenset(fields))
+        paginator = self.pagination_class()
+        parking_spots = paginator.paginate_queryset(plan.values(ParkingSpot.objects.all()), request, view=self)
+        return paginator.get_paginated_response(plan.serialize_dicts(parking_spots))
 
     @swagger_auto_schema(
         request_body=ParkingSpotSerializer,
@@ -190,6 +245,79 @@ class ParkingSpotListAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class BulkWriteAPIView(APIView):
+    # permission_classes = [IsAuthenticated]
+    # authentication_classes = [JWTAuthentication]
+    serializer_class = None
+    max_items = 5000
+
+    def post(self, request, format=None):
+        if not self._check_batch(request.data):
+            return Response({'error': f'Send a list of at most {self.max_items} records.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.serializer_class(data=request.data, many=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def patch(self, request, format=None):
+        if not self._check_batch(request.data):
+            return Response({'error': f'Send a list of at most {self.max_items} records.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        model = self.serializer_class.Meta.model
+        ids = [item['id'] for item in request.data if isinstance(item, dict) and isinstance(item.get('id'), int)]
+        instances = list(model.objects.filter(pk__in=ids))
+        serializer = self.serializer_class(instances, data=request.data, many=True, partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def _check_batch(self, data):
+        return isinstance(data, list) and 0 < len(data) <= self.max_items
+
+
+class ParkingSpotBulkAPIView(BulkWriteAPIView):
+    serializer_class = ParkingSpotBulkSerializer
+
+    @swagger_auto_schema(
+        request_body=ParkingSpotBulkSerializer(many=True),
+        responses={201: ParkingSpotSerializer(many=True), 400: "Per-item validation errors"},
+        operation_description="Create many parking spots in one transaction."
+    )
+    def post(self, request, format=None):
+        return super().post(request, format)
+
+    @swagger_auto_schema(
+        request_body=ParkingSpotBulkSerializer(many=True),
+        responses={200: ParkingSpotSerializer(many=True), 400: "Per-item validation errors"},
+        operation_description="Update many parking spots, identified by id, in one transaction."
+    )
+    def patch(self, request, format=None):
+        return super().patch(request, format)
+
+
+class LocationBulkAPIView(BulkWriteAPIView):
+    serializer_class = LocationBulkSerializer
+
+    @swagger_auto_schema(
+        request_body=LocationBulkSerializer(many=True),
+        responses={201: LocationSerializer(many=True), 400: "Per-item validation errors"},
+        operation_description="Create many locations in one transaction."
+    )
+    def post(self, request, format=None):
+        return super().post(request, format)
+
+    @swagger_auto_schema(
+        request_body=LocationBulkSerializer(many=True),
+        responses={200: LocationSerializer(many=True), 400: "Per-item validation errors"},
+        operation_description="Update many locations, identified by id, in one transaction."
+    )
+    def patch(self, request, format=None):
+        return super().patch(request, format)
+
+
 class ParkingSpotDetailAPIView(APIView):
     # permission_classes = [IsAuthenticated]
     # authentication_classes = [JWTAuthentication]
@@ -243,15 +371,20 @@ class ParkingSpotDetailAPIView(APIView):
 class CarDetailListAPIView(APIView):
     # permission_classes = [IsAuthenticated]
     # authentication_classes = [JWTAuthentication]
+    pagination_class = KeysetPagination
 
     @swagger_auto_schema(
+        manual_parameters=[FIELDS_PARAMETER],
         responses={200:  CarDetailSerializer(many=True)},
         operation_description="Retrieve the list of car."
     )
     def get(self, request, format=None):
-        locations = CarDetail.objects.all()
-        serializer =  CarDetailSerializer(locations, many=True)
-        return Response(serializer.data)
+        fields = sparse_fields(request.query_params, CarDetailSerializer)
+        paginator = self.pagination_class()
+        locations = paginator.paginate_queryset(
+            sparse_queryset(CarDetail.objects.all(), fields), request, view=self)
+        serializer =  CarDetailSerializer(locations, many=True, context={'fields': fields})
+        return paginator.get_paginated_response(serializer.data)
 
     @swagger_auto_schema(
         request_body= CarDetailSerializer,
@@ -312,22 +445,27 @@ class CarDetailDetailAPIView(APIView):
             raise NotFound("Car detail not found with the specified ID", code=status.HTTP_404_NOT_FOUND)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
+@idempotent
 def create_booking(request, pk=1):
     user = request.user
-    bookings = Booking.objects.filter(user_id=user.id)
-
-    if bookings.exists():
-        bookingdata = bookings.first()  
-    else:
-       bookingdata = Booking(user_id=user)  
+    # Turn away spots held by another user before any validation or write.
+    try:
+        held_by = holds.holder(int(request.data.get('spot_id')))
+    except (TypeError, ValueError):
+        held_by = None
+    if held_by not in (None, user.pk):
+        return Response({'error': 'Spot is held by another user.'}, status=status.HTTP_409_CONFLICT)
 
-    request.data['user_id'] = user.id
+    bookingdata = Booking(user_id=user)
 
-    serializer = BookingSerializer(bookingdata, data=request.data, context={"request": request})
+    serializer = OwnBookingSerializer(bookingdata, data=request.data, context={"request": request})
 
     if serializer.is_valid():
-        serializer.save()
+        try:
+            save_booking(serializer, user_id=user)
+        except BookingConflict as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
         return Response({'message': 'Booking created successfully'}, status=status.HTTP_201_CREATED)
     else:
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -335,59 +473,285 @@ def create_booking(request, pk=1):
 
 
 
+@swagger_auto_schema(
+    method='post',
+    request_body=BatchBookingSerializer,
+    responses={
+        201: "Bookings created, with a result per occurrence",
+        400: "Invalid input",
+        409: "Some occurrences conflict with existing bookings; nothing was booked",
+    },
+    operation_description="Book several spots and/or a recurring schedule in one transaction."
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@authentication_classes([CachedJWTAuthentication])
+@idempotent
+def create_booking_batch(request):
+    serializer = BatchBookingSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    params = serializer.validated_data
+    held = holds.held_by_others([spot.pk for spot in params['spot_ids']], request.user.pk)
+    if held:
+        return Response({'error': 'Some spots are held by other users.', 'held_spot_ids': sorted(held)},
+                        status=status.HTTP_409_CONFLICT)
+    bookings, conflicts = save_booking_batch(
+        request.user, params['spot_ids'], params['dates'], params['startTime'], params['endTime'],
+        atomic=params['atomic'])
+
+    conflict_list = [
+        {'spot_id': spot_id, 'bookingDate': date, 'conflicts': booking_ids}
+        for (spot_id, date), booking_ids in sorted(conflicts.items())
+    ]
+    if conflicts and params['atomic']:
+        return Response({'error': f'{len(conflicts)} occurrences conflict with existing bookings.',
+                         'conflicts': conflict_list}, status=status.HTTP_409_CONFLICT)
+    results = [
+        {'spot_id': booking.spot_id_id, 'bookingDate': booking.bookingDate, 'status': 'created',
+         'booking_id': booking.pk}
+        for booking in bookings
+    ] + [dict(item, status='conflict') for item in conflict_list]
+    results.sort(key=lambda item: (item['bookingDate'], item['spot_id']))
+    return Response({'created': len(bookings), 'conflicts': len(conflicts), 'results': results},
+                    status=status.HTTP_201_CREATED)
+
+
 @api_view(['GET'])
+@read_replica
 def get_all_cities(request):
-    cities = City.objects.all()
-    serializer = CitySerializer(cities, many=True)
-    return Response({'Cities': serializer.data}, status=status.HTTP_200_OK)
+    def build():
+        cities = City.objects.all()
+        return CitySerializer(cities, many=True).data
+
+    cities = catalog.cached_payload(['cities'], 'get_all_cities', build)
+    return Response({'Cities': cities}, status=status.HTTP_200_OK)
 
 
 
 @api_view(['POST'])
+@read_replica
 def get_locations_by_city(request):
     city_id = request.data.get('city_id')
     if city_id is not None:
-        locations = Location.objects.filter(city_id=city_id)
-        serializer = LocationSerializer(locations, many=True)
-        return Response({'Locations': serializer.data}, status=status.HTTP_200_OK)
+        try:
+            city_id = int(city_id)
+        except (TypeError, ValueError):
+            return Response({'error': 'city_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        def build():
+            locations = Location.objects.filter(city_id=city_id)
+            return LocationSerializer(locations, many=True).data
+
+        locations = catalog.cached_payload([f'city:{city_id}'], f'get_locations_by_city:{city_id}', build)
+        return Response({'Locations': locations}, status=status.HTTP_200_OK)
     else:
         return Response({'error': 'city_id not provided in the request data'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+@swagger_auto_schema(
+    method='get',
+    query_serializer=OccupancyQuerySerializer,
+    operation_description="Booked minutes per hour or day for a location or a whole city."
+)
+@api_view(['GET'])
+@read_replica
+def get_occupancy(request):
+    query = OccupancyQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'Occupancy': occupancy.occupancy(**query.validated_data)}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_catalog_cache_stats(request):
+    return Response(catalog.stats(), status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='get',
+    query_serializer=NearbyLocationQuerySerializer,
+    operation_description="Nearest locations to a point, with distance and free spot count."
+)
+@api_view(['GET'])
+@read_replica
+def get_nearby_locations(request):
+    query = NearbyLocationQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+    params = query.validated_data
+    nearest = nearest_locations(params['latitude'], params['longitude'], params['k'], params.get('radius_km'))
+    results = []
+    for distance, location in nearest:
+        data = LocationSerializer(location).data
+        data['distance_km'] = round(distance, 3)
+        data['free_spots'] = location.freeSpots
+        results.append(data)
+    return Response({'Locations': results}, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='get',
+    query_serializer=AutocompleteQuerySerializer,
+    operation_description="City and location names matching a prefix, ignoring case and accents and "
+                          "allowing one typo."
+)
+@api_view(['GET'])
+@read_replica
+def autocomplete(request):
+    query = AutocompleteQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+    params = query.validated_data
+    kinds = (params['type'],) if 'type' in params else ('city', 'location')
+    matches = name_index.search(params['q'], params['k'], kinds)
+    return Response({'Matches': matches}, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
+@read_replica
 def get_spot_numbers_by_location(request):
     location_id = request.data.get('location_id')
-    if location_id is not None:
-        spot_numbers = ParkingSpot.objects.filter(location_id=location_id, lsBooked=False)
-        serializer = ParkingSpotSerializer(spot_numbers, many=True)
-        return Response({'SpotNumbers': serializer.data}, status=status.HTTP_200_OK)
-    else:
+    if location_id is None:
         return Response({'error': 'location_id not provided in the request data'}, status=status.HTTP_400_BAD_REQUEST)
 
+    query = AvailabilityQuerySerializer(data=request.data)
+    if not query.is_valid():
+        return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+    params = query.validated_data
+
+    if 'bookingDate' in params:
+        # Free for the requested window, whatever lsBooked says right now.
+        busy = availability_index.busy_spot_ids(
+            params['location_id'], params['bookingDate'], params['startTime'], params['endTime'])
+        spot_numbers = ParkingSpot.objects.filter(location_id=params['location_id']).exclude(id__in=busy)
+    else:
+        spot_numbers = ParkingSpot.objects.filter(location_id=params['location_id'], lsBooked=False)
+    plan = field_plan(ParkingSpotSerializer)
+    spots = plan.serialize(plan.values_list(spot_numbers))
+    held = holds.held_by_others([spot['id'] for spot in spots], request.user.pk)
+    if held:
+        spots = [spot for spot in spots if spot['id'] not in held]
+    return Response({'SpotNumbers': spots}, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=SpotHoldSerializer,
+    responses={
+        201: "Spot held, with the hold's expiry",
+        409: "Spot is held by another user",
+    },
+    operation_description="Hold a spot during checkout for SPOT_HOLD_TTL seconds, or extend your hold."
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@authentication_classes([CachedJWTAuthentication])
+def hold_spot(request):
+    serializer = SpotHoldSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    hold = holds.acquire(serializer.validated_data['spot_id'].pk, request.user.pk)
+    if hold is None or hold.user_id != request.user.pk:
+        return Response({'error': 'Spot is held by another user.'}, status=status.HTTP_409_CONFLICT)
+    return Response(hold.as_dict(), status=status.HTTP_201_CREATED)
+
+
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated])
+@authentication_classes([CachedJWTAuthentication])
+def release_spot_hold(request, spot_id):
+    holds.release(spot_id, request.user.pk)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=OwnBookingSerializer,
+    responses={
+        201: "Booking created from the hold",
+        409: "No current hold on the spot, or the spot is already booked",
+    },
+    operation_description="Book a spot you are holding; the hold is released."
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@authentication_classes([CachedJWTAuthentication])
+@idempotent
+def confirm_spot_hold(request, spot_id):
+    user = request.user
+    if holds.holder(spot_id) != user.pk:
+        return Response({'error': 'You do not hold this spot, or the hold has expired.'},
+                        status=status.HTTP_409_CONFLICT)
+    data = {name: request.data[name] for name in ('bookingDate', 'startTime', 'endTime', 'city_id', 'location_id')
+            if name in request.data}
+    serializer = OwnBookingSerializer(Booking(user_id=user), data={**data, 'spot_id': spot_id})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        save_booking(serializer, user_id=user)
+    except BookingConflict as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+    holds.release(spot_id, user.pk)
+    return Response({'message': 'Booking created successfully', 'data': serializer.data},
+                    status=status.HTTP_201_CREATED)
+
+
+def _held_by_other(serializer):
+    """True if the booking's spot is held by someone other than the user it is booked for."""
+    data, instance = serializer.validated_data, serializer.instance
+    spot = data.get('spot_id') or instance.spot_id
+    user = data.get('user_id') or instance.user_id
+    return holds.holder(spot.pk) not in (None, user.pk)
 
 
 class BookingListAPIView(APIView):
     # permission_classes = [IsAuthenticated]
     # authentication_classes = [JWTAuthentication]
+    pagination_class = KeysetPagination
 
     @swagger_auto_schema(
+        manual_parameters=[FIELDS_PARAMETER],
+        query_serializer=BookingListQuerySerializer,
         responses={200: BookingSerializer(many=True)},
-        operation_description="Retrieve a list of all bookings."
+        operation_description="Retrieve a list of all bookings, including archived ones for dates past the archive horizon."
     )
     def get(self, request, format=None):
-        bookings = Booking.objects.all()
-        serializer = BookingSerializer(bookings, many=True)
-        return Response(serializer.data)
+        query = BookingListQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+        expand = params['expand']
+        fields = sparse_fields(request.query_params, BookingSerializer)
+
+        def prepare(bookings):
+            bookings = sparse_queryset(bookings, fields, BOOKING_RELATIONS if expand else ())
+            return expand_bookings(bookings, expand)
+
+        bookings = archive.bookings_between(params.get('date_from'), params.get('date_to'), prepare)
+        paginator = self.pagination_class()
+        bookings = paginator.paginate_queryset(bookings, request, view=self)
+        serializer = BookingSerializer(bookings, many=True, context={'expand': expand, 'fields': fields})
+        return paginator.get_paginated_response(serializer.data)
 
     @swagger_auto_schema(
         request_body=BookingSerializer,
-        responses={201: BookingSerializer()},
+        responses={
+            201: BookingSerializer(),
+            409: "Spot is already booked for the requested time",
+        },
         operation_description="Create a new booking."
     )
+    @idempotent
     def post(self, request, format=None):
         serializer = BookingSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            if _held_by_other(serializer):
+                return Response({'error': 'Spot is held by another user.'}, status=status.HTTP_409_CONFLICT)
+            try:
+                save_booking(serializer)
+            except BookingConflict as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
             return Response({'success': True, 'data': serializer.data},
                             status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -395,6 +759,29 @@ class BookingListAPIView(APIView):
 
 
 
+class BookingExportAPIView(APIView):
+    # permission_classes = [IsAuthenticated]
+    # authentication_classes = [JWTAuthentication]
+
+    @swagger_auto_schema(
+        query_serializer=BookingExportQuerySerializer,
+        responses={200: "Bookings as NDJSON or CSV"},
+        operation_description="Stream all bookings matching the filters as NDJSON or CSV."
+    )
+    def get(self, request, format=None):
+        query = BookingExportQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = dict(query.validated_data)
+        output = params.pop('output')
+        response = StreamingHttpResponse(
+            export_bookings(filter_bookings(**params), output=output),
+            content_type=CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="bookings.{output}"'
+        return response
+
+
 class BookingDetailAPIView(APIView):
     # permission_classes = [IsAuthenticated]
     # authentication_classes = [JWTAuthentication]
@@ -403,6 +790,7 @@ class BookingDetailAPIView(APIView):
         manual_parameters=[
             openapi.Parameter('pk', openapi.IN_PATH, description="Booking ID", type=openapi.TYPE_INTEGER),
         ],
+        query_serializer=BookingExpandQuerySerializer,
         responses={
             200: BookingSerializer(),
             404: "Booking not found with the specified ID",
@@ -410,9 +798,19 @@ class BookingDetailAPIView(APIView):
         operation_description="Retrieve a booking by ID."
     )
     def get(self, request, pk, format=None):
-        booking = self.get_object(pk)
+        query = BookingExpandQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        expand = query.validated_data['expand']
+        try:
+            booking = self.get_object(pk, expand_bookings(Booking.objects.all(), expand))
+        except NotFound:
+            # Past bookings may have been archived under the same ID.
+            booking = expand_bookings(ArchivedBooking.objects.all(), expand).filter(pk=pk).first()
+            if booking is None:
+                raise
         if booking is not None:
-            serializer = BookingSerializer(booking)
+            serializer = BookingSerializer(booking, context={'expand': expand})
             return Response(serializer.data)
         return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -425,6 +823,7 @@ class BookingDetailAPIView(APIView):
             200: BookingSerializer(),
             400: "Invalid input",
             404: "Booking not found with the specified ID",
+            409: "Spot is already booked for the requested time",
         },
         operation_description="Update a booking by ID."
     )
@@ -433,7 +832,12 @@ class BookingDetailAPIView(APIView):
         if booking is not None:
             serializer = BookingSerializer(booking, data=request.data)
             if serializer.is_valid():
-                serializer.save()
+                if _held_by_other(serializer):
+                    return Response({'error': 'Spot is held by another user.'}, status=status.HTTP_409_CONFLICT)
+                try:
+                    save_booking(serializer)
+                except BookingConflict as exc:
+                    return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_404_NOT_FOUND)
@@ -457,11 +861,11 @@ class BookingDetailAPIView(APIView):
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_404_NOT_FOUND)
     
-    def get_object(self, pk):
+    def get_object(self, pk, queryset=Booking.objects):
         try:
-            return Booking.objects.get(pk=pk)
+            return queryset.get(pk=pk)
         except Booking.DoesNotExist:
-            raise Booking("Booking not found with the specified ID", code=status.HTTP_404_NOT_FOUND)
+            raise NotFound("Booking not found with the specified ID", code=status.HTTP_404_NOT_FOUND)
 
 
 class RegistrationAPIView(APIView):
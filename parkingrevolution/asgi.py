@@ -9,8 +9,17 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'parkingrevolution.settings')
 
 application = get_asgi_application()
+
+if settings.EXPIRY_SWEEPER_IN_PROCESS:
+    from api.expiry import start_in_process
+    start_in_process()
+
+if settings.NAME_INDEX_WARM_ON_STARTUP:
+    from api.search import warm_in_background
+    warm_in_background()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,8 +52,25 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Inactive unless REQUEST_PROFILING is set; keep it last.
+    'api.middleware.RequestProfilingMiddleware',
 ]
 
+# Per-request SQL and timing instrumentation (api/middleware.py).
+REQUEST_PROFILING = os.environ.get('DJANGO_REQUEST_PROFILING', '') == '1'
+REQUEST_PROFILING_REPEAT_THRESHOLD = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.profiling': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 ROOT_URLCONF = 'parkingrevolution.urls'
 
 TEMPLATES = [
@@ -77,13 +95,78 @@ WSGI_APPLICATION = 'parkingrevolution.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
+# DJANGO_DB_PROFILE picks the database profile:
+#   development (default): Django's defaults, a connection per request.
+#   production: persistent connections with health checks, and WAL,
+#   busy_timeout and synchronous pragmas on SQLite (api/db.py).
+# Postgres is used when POSTGRES_DB is set. A 'replica' alias is added
+# from POSTGRES_REPLICA_HOST or SQLITE_REPLICA_PATH; views wrapped in
+# api.db.read_replica read from it through ReadReplicaRouter.
+
+DB_PROFILE = os.environ.get('DJANGO_DB_PROFILE', 'development')
+
+if os.environ.get('POSTGRES_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['POSTGRES_DB'],
+            'USER': os.environ.get('POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', ''),
+            'PORT': os.environ.get('POSTGRES_PORT', ''),
+        }
+    }
+    if os.environ.get('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = {**DATABASES['default'], 'HOST': os.environ['POSTGRES_REPLICA_HOST']}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+    if os.environ.get('SQLITE_REPLICA_PATH'):
+        DATABASES['replica'] = {**DATABASES['default'], 'NAME': os.environ['SQLITE_REPLICA_PATH']}
+
+SQLITE_PRAGMAS = {}
+
+if DB_PROFILE == 'production':
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 600
+        database['CONN_HEALTH_CHECKS'] = True
+    SQLITE_PRAGMAS = {'journal_mode': 'wal', 'busy_timeout': 5000, 'synchronous': 'normal'}
+
+if 'replica' in DATABASES:
+    # Tests run against the default test database only.
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['api.db.ReadReplicaRouter']
+DATABASE_REPLICA_ALIAS = 'replica'
+
+
+# Cache
+# Local memory by default; set REDIS_URL to share the cache (and catalog
+# invalidations) between worker processes.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Serialized city/location payloads (api/catalog.py). Writes invalidate
+# them only in caches they can reach, so with the per-process local memory
+# cache the other workers serve old payloads until the timeout; keep it
+# short unless the cache is shared.
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = 60 * 60 if os.environ.get('REDIS_URL') else 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -131,9 +214,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
         # ... other authentication classes
     ),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
 }
 
 
@@ -145,4 +230,42 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
-}
\ No newline at end of file
+}
+
+# Seconds an authenticated user is served from the cache by
+# api.authentication.CachedJWTAuthentication.
+JWT_USER_CACHE_ALIAS = 'default'
+JWT_USER_CACHE_TIMEOUT = 60
+
+# Bounds for the in-process booking interval index (api/availability.py).
+AVAILABILITY_INDEX_MAX_KEYS = 10000
+AVAILABILITY_INDEX_TTL = 60
+
+# Release booked spots whose bookings have ended (api/expiry.py) from a
+# thread in the ASGI process, instead of running sweep_expired_bookings.
+EXPIRY_SWEEPER_IN_PROCESS = os.environ.get('DJANGO_EXPIRY_SWEEPER_IN_PROCESS', '') == '1'
+EXPIRY_SWEEPER_INTERVAL = 60
+
+# In-process prefix index for /autocomplete/ (api/search.py). It is built
+# from a thread when the server starts, and rebuilt after the TTL to pick
+# up names changed by other processes.
+NAME_INDEX_WARM_ON_STARTUP = True
+NAME_INDEX_TTL = 300
+
+# Bookings older than this many days are moved to ArchivedBooking by
+# archive_bookings, and the booking list reads both tables for such dates.
+BOOKING_ARCHIVE_HORIZON_DAYS = 180
+
+# Seconds a response is kept for replay under its Idempotency-Key.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+# Seconds a key stays claimed while its request runs. A claim left behind
+# by a worker that died can be reused after this, so keep it above the
+# slowest request.
+IDEMPOTENCY_PENDING_LEASE = 60
+
+# Checkout holds on parking spots (api/holds.py). The cache store needs a
+# cache shared by every worker, so without Redis the holds live in the
+# database; the cache store also falls back to it when the cache fails.
+SPOT_HOLD_TTL = 120
+SPOT_HOLD_CACHE_ALIAS = 'default'
+SPOT_HOLD_STORE = 'cache' if os.environ.get('REDIS_URL') else 'database'
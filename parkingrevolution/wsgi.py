@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'parkingrevolution.settings')
 
 application = get_wsgi_application()
+
+if settings.NAME_INDEX_WARM_ON_STARTUP:
+    from api.search import warm_in_background
+    warm_in_background()